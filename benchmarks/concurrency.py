@@ -0,0 +1,79 @@
+import argparse
+import asyncio
+import time
+from typing import List
+
+import httpx
+
+DEFAULT_QUESTIONS = [
+    "What is multi-head attention?",
+    "Explain the transformer architecture.",
+    "Why is self-attention faster than recurrence?",
+    "What BLEU score did the big transformer reach on EN-DE?",
+    "How are positional encodings computed?",
+]
+
+async def run_level(base_url: str, concurrency: int, total: int, k: int, timeout: float):
+    """Fire `total` queries with at most `concurrency` in flight and time them"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout) as client:
+        async def one(i: int):
+            nonlocal errors
+            question = DEFAULT_QUESTIONS[i % len(DEFAULT_QUESTIONS)]
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    response = await client.post("/query", json={"question": question, "k": k})
+                    response.raise_for_status()
+                except Exception:
+                    errors += 1
+                    return
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "elapsed_s": elapsed,
+        "qps": (total - errors) / elapsed if elapsed else 0.0,
+        "mean_latency_s": sum(latencies) / len(latencies) if latencies else 0.0,
+    }
+
+async def main(base_url: str, levels: List[int], requests_per_level: int, k: int, timeout: float):
+    """Measure throughput at each concurrency level against a running API"""
+    print(f"Benchmarking {base_url}/query")
+    print(f"{'conc':>5} {'reqs':>5} {'errs':>5} {'qps':>8} {'mean(s)':>8} {'scaling':>8}")
+    baseline = None
+    for level in levels:
+        result = await run_level(base_url, level, requests_per_level, k, timeout)
+        if baseline is None:
+            baseline = result["qps"] or 1.0
+        print(
+            f"{result['concurrency']:>5} {result['requests']:>5} {result['errors']:>5} "
+            f"{result['qps']:>8.2f} {result['mean_latency_s']:>8.2f} "
+            f"{result['qps'] / baseline:>7.2f}x"
+        )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrency benchmark for the /query endpoint")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--levels", default="1,2,4,8,16", help="Comma separated in-flight request counts")
+    parser.add_argument("--requests", type=int, default=32, help="Requests sent per concurrency level")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+
+    asyncio.run(main(
+        args.url,
+        [int(level) for level in args.levels.split(",")],
+        args.requests,
+        args.k,
+        args.timeout,
+    ))
@@ -0,0 +1,190 @@
+import argparse
+import asyncio
+import json
+import time
+import uuid
+import zlib
+from typing import Optional
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+class LatencyModel:
+    """
+    Time to first token plus a fixed decode rate. The time to first token
+    is either fixed or drawn from a lognormal whose median is ttft_ms.
+    """
+
+    def __init__(
+        self,
+        ttft_ms: float = 500.0,
+        distribution: str = "fixed",
+        sigma: float = 0.5,
+        tokens_per_second: float = 50.0,
+        seed: Optional[int] = None
+    ):
+        self.ttft_ms = ttft_ms
+        self.distribution = distribution
+        self.sigma = sigma
+        self.tokens_per_second = tokens_per_second
+        self.rng = np.random.default_rng(seed)
+
+    def first_token_seconds(self) -> float:
+        if self.distribution == "lognormal":
+            return float(self.rng.lognormal(np.log(self.ttft_ms), self.sigma)) / 1000
+        return self.ttft_ms / 1000
+
+    def token_seconds(self) -> float:
+        return 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+def count_prompt_tokens(messages) -> int:
+    """Rough token count (4 characters per token), including image parts"""
+    chars = 0
+    for message in messages:
+        content = message.get("content", "")
+        if isinstance(content, str):
+            chars += len(content)
+        else:
+            for part in content:
+                chars += len(part.get("text", "")) if part.get("type") == "text" else 4 * 85
+    return max(1, chars // 4)
+
+def create_app(
+    latency: LatencyModel,
+    completion_tokens: int = 100,
+    error_rate: float = 0.0,
+    embedding_dim: int = 1536
+) -> FastAPI:
+    app = FastAPI(title="Fake OpenAI API")
+    words = "the transformer uses multi head self attention instead of recurrence".split()
+    stats = {"requests": 0, "errors": 0, "in_flight": 0, "max_in_flight": 0}
+
+    def completion_text(n_tokens: int):
+        return [words[i % len(words)] + " " for i in range(n_tokens)]
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+        if error_rate and latency.rng.random() < error_rate:
+            stats["errors"] += 1
+            raise HTTPException(status_code=500, detail="Injected failure")
+
+        model = body.get("model", "fake")
+        n_tokens = min(completion_tokens, body.get("max_tokens") or completion_tokens)
+        prompt_tokens = count_prompt_tokens(body.get("messages", []))
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": n_tokens,
+            "total_tokens": prompt_tokens + n_tokens,
+        }
+
+        if not body.get("stream"):
+            stats["in_flight"] += 1
+            stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+            try:
+                await asyncio.sleep(latency.first_token_seconds() + n_tokens * latency.token_seconds())
+            finally:
+                stats["in_flight"] -= 1
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(completion_text(n_tokens))},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            }
+
+        include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+
+        def chunk(delta: dict, finish_reason=None, chunk_usage=None):
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [] if chunk_usage else [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            if chunk_usage:
+                payload["usage"] = chunk_usage
+            return f"data: {json.dumps(payload)}\n\n"
+
+        async def event_stream():
+            stats["in_flight"] += 1
+            stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+            try:
+                await asyncio.sleep(latency.first_token_seconds())
+                yield chunk({"role": "assistant", "content": ""})
+                for i, token in enumerate(completion_text(n_tokens)):
+                    if i:
+                        await asyncio.sleep(latency.token_seconds())
+                    yield chunk({"content": token})
+                yield chunk({}, finish_reason="stop")
+                if include_usage:
+                    yield chunk({}, chunk_usage=usage)
+                yield "data: [DONE]\n\n"
+            finally:
+                stats["in_flight"] -= 1
+
+        return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        inputs = body.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        data = []
+        for i, text in enumerate(inputs):
+            # Deterministic per text, so repeated texts embed identically
+            rng = np.random.default_rng(zlib.crc32(str(text).encode("utf-8")))
+            vector = rng.standard_normal(embedding_dim)
+            vector /= np.linalg.norm(vector)
+            data.append({"object": "embedding", "index": i, "embedding": vector.tolist()})
+        await asyncio.sleep(latency.first_token_seconds() / 10)
+        return {
+            "object": "list",
+            "data": data,
+            "model": body.get("model", "fake-embedding"),
+            "usage": {"prompt_tokens": 0, "total_tokens": 0},
+        }
+
+    @app.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": [{"id": "fake", "object": "model", "owned_by": "local"}]}
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    return app
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Fake OpenAI-compatible server for load tests",
+        epilog="Point a service at it with OPENAI_BASE_URL=http://localhost:<port>/v1 "
+               "(OPENAI_API_BASE for graph_rag_neo4j)."
+    )
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--ttft-ms", type=float, default=500.0, help="Time to first token (median for lognormal)")
+    parser.add_argument("--distribution", choices=["fixed", "lognormal"], default="fixed")
+    parser.add_argument("--sigma", type=float, default=0.5, help="Lognormal shape parameter")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0, help="Decode rate after the first token")
+    parser.add_argument("--completion-tokens", type=int, default=100)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of chat requests failing with 500")
+    parser.add_argument("--embedding-dim", type=int, default=1536)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    latency = LatencyModel(args.ttft_ms, args.distribution, args.sigma, args.tokens_per_second, args.seed)
+    app = create_app(latency, args.completion_tokens, args.error_rate, args.embedding_dim)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,297 @@
+import argparse
+import importlib
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARKS_DIR = os.path.join(ROOT, "benchmarks")
+RESULTS_DIR = os.path.join(BENCHMARKS_DIR, "results")
+
+# Score every pair with the cross-encoder so repeats measure real reranking latency
+os.environ.setdefault("RERANK_CACHE_SIZE", "0")
+os.environ.setdefault("RERANK_BATCHING", "0")
+
+# Flat module names the apps import from their own directory. metrics is
+# left out on purpose: re-importing it would register its Prometheus
+# collectors twice, and the apps ship identical copies.
+APP_MODULES = (
+    "db", "search", "rerank", "bm25", "batcher", "score_cache", "numpy_store",
+    "ann_index", "onnx_backend", "context_builder", "semantic_cache",
+)
+
+# Settings recorded with every run so results can be compared meaningfully
+RECORDED_ENV = (
+    "VECTOR_BACKEND", "NUMPY_INDEX_DTYPE", "NUMPY_INDEX_TYPE", "IVF_NPROBE",
+    "INFERENCE_BACKEND", "RRF_K", "HYBRID_CANDIDATES", "CASCADE_WIN_GAP",
+)
+
+Retriever = Callable[[str, int], Tuple[List[str], Dict[str, float]]]
+
+def normalize(text: str) -> str:
+    """Lowercase alphanumerics only, so PDF hyphenation and spacing don't break matches"""
+    return re.sub(r"[^a-z0-9]", "", text.lower())
+
+def is_relevant(text: str, answers: List[str]) -> bool:
+    normalized = normalize(text)
+    return any(answer in normalized for answer in answers)
+
+class StageTimer:
+    """Accumulates wall time per named stage of one retrieval"""
+
+    def __init__(self):
+        self.seconds: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] = self.seconds.get(name, 0.0) + time.perf_counter() - start
+
+@contextmanager
+def app_context(app_dir: str):
+    """
+    Import an app's flat modules from its own directory with its relative
+    paths (index, documents) resolving as they do when the app runs.
+    """
+    cwd = os.getcwd()
+    for name in APP_MODULES:
+        sys.modules.pop(name, None)
+    sys.path.insert(0, app_dir)
+    os.chdir(app_dir)
+    try:
+        yield
+    finally:
+        os.chdir(cwd)
+        sys.path.remove(app_dir)
+        for name in APP_MODULES:
+            sys.modules.pop(name, None)
+
+def dense_retriever(vectorstore, embeddings) -> Retriever:
+    def retrieve(query: str, k: int):
+        timer = StageTimer()
+        with timer.stage("embed"):
+            vector = embeddings.embed_query(query)
+        with timer.stage("dense_search"):
+            docs = vectorstore.similarity_search_by_vector(vector, k=k)
+        return [doc.page_content for doc in docs], timer.seconds
+    return retrieve
+
+def hybrid_retriever(vectorstore, embeddings, search, candidates: int) -> Retriever:
+    bm25 = importlib.import_module("bm25")
+    lexical_index = search.get_lexical_index(vectorstore)
+
+    def retrieve(query: str, k: int):
+        timer = StageTimer()
+        n = max(k, candidates)
+        with timer.stage("embed"):
+            vector = embeddings.embed_query(query)
+        with timer.stage("dense_search"):
+            dense = [doc.page_content for doc in vectorstore.similarity_search_by_vector(vector, k=n)]
+        with timer.stage("bm25"):
+            lexical = [text for text, _ in lexical_index.search(query, n)]
+        with timer.stage("fusion"):
+            fused = bm25.reciprocal_rank_fusion([dense, lexical], k=search.RRF_K)[:n]
+        return fused, timer.seconds
+    return retrieve
+
+def reranked(retriever: Retriever, reranker, candidates: int) -> Retriever:
+    """Rerank the first `candidates` results of another retriever"""
+    def retrieve(query: str, k: int):
+        texts, seconds = retriever(query, candidates)
+        start = time.perf_counter()
+        texts = reranker.rerank_documents(query, texts, top_k=k)
+        seconds["rerank"] = time.perf_counter() - start
+        return texts, seconds
+    return retrieve
+
+def evaluate(
+    retriever: Retriever,
+    corpus: List[str],
+    queries: List[dict],
+    ks: List[int],
+    repeats: int
+) -> dict:
+    """Quality metrics over the labelled queries and latency percentiles per stage"""
+    max_k = max(ks)
+    retriever(queries[0]["question"], max_k)  # warm-up, not timed
+
+    stage_seconds: Dict[str, List[float]] = {}
+    hits = {k: [] for k in ks}
+    recalls = {k: [] for k in ks}
+    reciprocal_ranks, per_query = [], []
+    for query in queries:
+        answers = [normalize(a) for a in query["answers"]]
+        n_relevant = sum(is_relevant(text, answers) for text in corpus)
+
+        for repeat in range(repeats):
+            start = time.perf_counter()
+            texts, seconds = retriever(query["question"], max_k)
+            seconds["total"] = time.perf_counter() - start
+            for stage, value in seconds.items():
+                stage_seconds.setdefault(stage, []).append(value)
+
+        relevant = [is_relevant(text, answers) for text in texts[:max_k]]
+        first = next((rank for rank, rel in enumerate(relevant, start=1) if rel), None)
+        reciprocal_ranks.append(1.0 / first if first else 0.0)
+        for k in ks:
+            found = sum(relevant[:k])
+            hits[k].append(1.0 if found else 0.0)
+            recalls[k].append(found / n_relevant if n_relevant else 0.0)
+        per_query.append({"id": query["id"], "first_relevant_rank": first, "relevant_in_corpus": n_relevant})
+
+    result = {"queries": len(queries), "mrr": float(np.mean(reciprocal_ranks))}
+    for k in ks:
+        result[f"recall@{k}"] = float(np.mean(recalls[k]))
+        result[f"hit@{k}"] = float(np.mean(hits[k]))
+    result["latency_ms"] = {
+        stage: {
+            f"p{p}": float(np.percentile(values, p) * 1000) for p in (50, 95, 99)
+        }
+        for stage, values in stage_seconds.items()
+    }
+    result["per_query"] = per_query
+    return result
+
+def run_naive(queries, ks, repeats, candidates) -> Dict[str, dict]:
+    with app_context(os.path.join(ROOT, "naive_rag")):
+        db = importlib.import_module("db")
+        search = importlib.import_module("search")
+        embeddings = db.initialize_embeddings()
+        vectorstore = db.create_vectorstore(None, embeddings)
+        corpus = vectorstore.get()["documents"]
+        return {
+            "naive": evaluate(dense_retriever(vectorstore, embeddings), corpus, queries, ks, repeats),
+            "naive-hybrid": evaluate(
+                hybrid_retriever(vectorstore, embeddings, search, candidates), corpus, queries, ks, repeats
+            ),
+        }
+
+def run_rerank(queries, ks, repeats, candidates) -> Dict[str, dict]:
+    with app_context(os.path.join(ROOT, "retrieve_and_rerank")):
+        db = importlib.import_module("db")
+        search = importlib.import_module("search")
+        embeddings = db.initialize_embeddings()
+        vectorstore = db.create_vectorstore(None, embeddings)
+        reranker = search.get_reranker()
+        corpus = vectorstore.get()["documents"]
+        dense = dense_retriever(vectorstore, embeddings)
+        hybrid = hybrid_retriever(vectorstore, embeddings, search, candidates)
+        return {
+            "rerank": evaluate(reranked(dense, reranker, candidates), corpus, queries, ks, repeats),
+            "rerank-hybrid": evaluate(reranked(hybrid, reranker, candidates), corpus, queries, ks, repeats),
+        }
+
+def run_multi_vector(queries, ks, repeats) -> Dict[str, dict]:
+    """
+    Search the multi-vector summary index if it has been built. Relevance
+    is judged on the summary texts the vectors were built from.
+    """
+    app_dir = os.path.join(ROOT, "multi_model_rag_api")
+    if not os.path.exists(os.path.join(app_dir, "chroma_db")):
+        print("Skipping multi-vector: multi_model_rag_api/chroma_db has not been built")
+        return {}
+
+    from langchain.embeddings import HuggingFaceEmbeddings
+    from langchain_chroma import Chroma
+
+    with app_context(app_dir):
+        embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+        vectorstore = Chroma(collection_name="mm_rag", embedding_function=embeddings, persist_directory="./chroma_db")
+        corpus = vectorstore.get()["documents"]
+        return {"multi-vector": evaluate(dense_retriever(vectorstore, embeddings), corpus, queries, ks, repeats)}
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return "unknown"
+
+def print_results(results: Dict[str, dict], ks: List[int]):
+    header = f"{'retriever':<15}" + "".join(f" {f'R@{k}':>6}" for k in ks) + f" {'MRR':>6}"
+    print(header + f"   {'stage':<13} {'p50(ms)':>8} {'p95(ms)':>8} {'p99(ms)':>8}")
+    for name, result in results.items():
+        quality = f"{name:<15}" + "".join(f" {result[f'recall@{k}']:>6.3f}" for k in ks) + f" {result['mrr']:>6.3f}"
+        for i, (stage, latency) in enumerate(result["latency_ms"].items()):
+            prefix = quality if i == 0 else " " * len(quality)
+            print(f"{prefix}   {stage:<13} {latency['p50']:>8.2f} {latency['p95']:>8.2f} {latency['p99']:>8.2f}")
+
+def print_comparison(baseline: dict, current: dict, ks: List[int]):
+    """Metric and total-latency deltas of the current run against a saved one"""
+    print(f"\nCompared with {baseline['label']} ({baseline['git_commit']}, {baseline['timestamp']})")
+    print(f"{'retriever':<15} {'metric':<12} {'before':>9} {'after':>9} {'delta':>9}")
+    for name, result in current["retrievers"].items():
+        before = baseline["retrievers"].get(name)
+        if before is None:
+            continue
+        rows = [(f"recall@{k}", f"recall@{k}") for k in ks] + [("mrr", "mrr")]
+        for label, key in rows:
+            if key in before:
+                print(f"{name:<15} {label:<12} {before[key]:>9.3f} {result[key]:>9.3f} {result[key] - before[key]:>+9.3f}")
+        for p in ("p50", "p95", "p99"):
+            b = before["latency_ms"]["total"][p]
+            a = result["latency_ms"]["total"][p]
+            print(f"{name:<15} {f'total {p}':<12} {b:>8.1f}ms {a:>8.1f}ms {(a - b) / b if b else 0:>+9.1%}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline retrieval quality and latency benchmark (no LLM calls)")
+    parser.add_argument("--queries", default=os.path.join(BENCHMARKS_DIR, "queries.json"))
+    parser.add_argument("--retrievers", default="naive,rerank,multi-vector")
+    parser.add_argument("--ks", default="1,3,5,10")
+    parser.add_argument("--candidates", type=int, default=20, help="Candidates fetched before fusion or reranking")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed runs per query")
+    parser.add_argument("--label", default="run", help="Name of this run in the results file")
+    parser.add_argument("--compare", default=None, help="Results file of an earlier run to compare against")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    with open(args.queries) as f:
+        queries = json.load(f)
+    ks = sorted(int(k) for k in args.ks.split(","))
+    selected = args.retrievers.split(",")
+
+    results: Dict[str, dict] = {}
+    if "naive" in selected:
+        results.update(run_naive(queries, ks, args.repeats, args.candidates))
+    if "rerank" in selected:
+        results.update(run_rerank(queries, ks, args.repeats, args.candidates))
+    if "multi-vector" in selected:
+        results.update(run_multi_vector(queries, ks, args.repeats))
+
+    print(f"\n{len(queries)} queries, {args.repeats} timed runs each, {args.candidates} candidates\n")
+    print_results(results, ks)
+
+    run = {
+        "label": args.label,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "config": {
+            "ks": ks,
+            "candidates": args.candidates,
+            "repeats": args.repeats,
+            "queries": os.path.relpath(args.queries, ROOT),
+            "env": {name: os.environ[name] for name in RECORDED_ENV if name in os.environ},
+        },
+        "retrievers": results,
+    }
+
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}-{args.label}.json")
+        with open(path, "w") as f:
+            json.dump(run, f, indent=2)
+        print(f"\nSaved results to {os.path.relpath(path, ROOT)}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(json.load(f), run, ks)
@@ -3,6 +3,7 @@ from pydantic import BaseModel
 from typing import List, Optional
 from dotenv import load_dotenv
 import os
+from metrics import MetricsMiddleware, metrics_response
 from neo4j_manager import Neo4jManager
 from rag_pipeline import GraphRAG
 
@@ -14,6 +15,7 @@ app = FastAPI(
     description="A FastAPI implementation of RAG with Neo4j graph database",
     version="1.0.0"
 )
+app.add_middleware(MetricsMiddleware)
 
 # Initialize Neo4j manager
 neo4j_manager = Neo4jManager(
@@ -60,6 +62,10 @@ async def ingest_document(document: DocumentInput):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/metrics")
+async def metrics():
+    return metrics_response()
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
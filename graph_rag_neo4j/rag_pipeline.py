@@ -1,6 +1,7 @@
 from langchain_openai import OpenAIEmbeddings, ChatOpenAI
 from typing import List, Dict, Any, Optional
 from neo4j_manager import Neo4jManager
+from metrics import LLM_TOKENS, track_stage
 import tiktoken
 
 class GraphRAG:
@@ -26,13 +27,15 @@ class GraphRAG:
         
     def generate_response(self, query: str, max_tokens: int = 500, temperature: float = 0.7) -> str:
         # Generate query embeddings
-        query_embedding = self.embeddings.embed_query(query)
+        with track_stage("embed"):
+            query_embedding = self.embeddings.embed_query(query)
         
         # Retrieve similar documents
-        similar_docs = self.neo4j_manager.find_similar_documents(
-            query_embedding=query_embedding,
-            top_k=3
-        )
+        with track_stage("graph_search"):
+            similar_docs = self.neo4j_manager.find_similar_documents(
+                query_embedding=query_embedding,
+                top_k=3
+            )
         
         # Construct prompt with context
         context = "\n\n".join([f"Context {i+1}:\n{doc['text']}" 
@@ -51,7 +54,13 @@ class GraphRAG:
         self.llm.temperature = temperature
         
         # Generate response
-        response = self.llm.predict(prompt)
+        with track_stage("llm"):
+            response = self.llm.predict(prompt)
+        
+        # predict() does not expose usage, so count tokens locally
+        model = self.llm.model_name
+        LLM_TOKENS.labels(model, "prompt").inc(self._count_tokens(prompt))
+        LLM_TOKENS.labels(model, "completion").inc(self._count_tokens(response))
         
         return response
         
@@ -0,0 +1,67 @@
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from langchain_core.documents import Document
+
+from docstore import SQLiteDocStore
+
+def check_store(store):
+    """BaseStore semantics the retriever relies on, and the build marker db checks"""
+    store.mset([
+        ("c_1", "lower"),
+        ("C_2", "upper"),
+        ("cx3", "wildcard"),
+        ("c%4", "percent"),
+        ("doc", Document(page_content="table", metadata={"type": "table"})),
+    ])
+    # Prefixes match case-sensitively and without LIKE wildcards
+    assert sorted(store.yield_keys("c_")) == ["c_1"], sorted(store.yield_keys("c_"))
+    assert sorted(store.yield_keys("C_")) == ["C_2"], sorted(store.yield_keys("C_"))
+    assert sorted(store.yield_keys("c%")) == ["c%4"], sorted(store.yield_keys("c%"))
+    assert sorted(store.yield_keys("")) == sorted(store.yield_keys())
+    assert store.mget(["C_2", "missing", "c_1"]) == ["upper", None, "lower"]
+    assert store.mget(["doc"])[0].metadata == {"type": "table"}
+    store.mdelete(["c_1"])
+    assert store.mget(["c_1"]) == [None] and "c_1" not in list(store.yield_keys("c"))
+    # Meta markers live outside the keys and are dropped with the content
+    assert store.get_meta("build_complete") is None
+    store.set_meta("build_complete", "1")
+    assert store.get_meta("build_complete") == "1" and "build_complete" not in list(store.yield_keys())
+    store.clear()
+    assert store.get_meta("build_complete") is None and list(store.yield_keys()) == []
+    print("Docstore checks passed")
+
+def timed_reads(store, keys, batches, k):
+    start = time.perf_counter()
+    for _ in range(batches):
+        store.mget(random.sample(keys, k))
+    return (time.perf_counter() - start) / batches * 1000
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the SQLite docstore and time cold and hot reads")
+    parser.add_argument("--docs", type=int, default=5000)
+    parser.add_argument("--doc-kb", type=float, default=8.0, help="Size of each stored document")
+    parser.add_argument("--k", type=int, default=5, help="Documents read per query")
+    parser.add_argument("--batches", type=int, default=500)
+    parser.add_argument("--cache-size", type=int, default=128)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="docstore_bench_") as tmp:
+        check_store(SQLiteDocStore(os.path.join(tmp, "check.sqlite")))
+
+        store = SQLiteDocStore(os.path.join(tmp, "bench.sqlite"), cache_size=args.cache_size)
+        payload = "x" * int(args.doc_kb * 1024)
+        keys = [f"doc-{i}" for i in range(args.docs)]
+        start = time.perf_counter()
+        store.mset([(key, Document(page_content=payload, metadata={"type": "text"})) for key in keys])
+        print(f"Wrote {args.docs} docs in {time.perf_counter() - start:.2f}s")
+
+        # Cold: keys drawn from the whole store; hot: from a working set that fits the cache
+        cold = timed_reads(store, keys, args.batches, args.k)
+        hot_keys = keys[:args.cache_size]
+        timed_reads(store, hot_keys, args.batches, args.k)
+        hot = timed_reads(store, hot_keys, args.batches, args.k)
+        print(f"mget of {args.k}: cold {cold:.3f} ms, hot {hot:.3f} ms")
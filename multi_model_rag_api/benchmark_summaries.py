@@ -0,0 +1,56 @@
+import argparse
+import os
+import time
+
+from summarizers import IMAGE_WORKERS, generate_img_summaries, generate_text_summaries
+
+def synthetic_elements(n, words=300):
+    """Distinct table-like elements so no two prompts share a cache entry"""
+    row = "layer | d_model | heads | params | BLEU EN-DE | BLEU EN-FR | training cost"
+    return [f"Table {i}\n" + "\n".join(f"{row} {i}.{j}" for j in range(words // 12)) for i in range(n)]
+
+def load_elements(fpath, fname):
+    """Texts and tables extracted from a PDF, as the index build sees them"""
+    from extractors import process_document
+    texts, tables = process_document(fpath, fname)
+    return texts + tables
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark summarization wall-clock time of the index build versus concurrency",
+        epilog="Run against benchmarks/fake_llm.py (OPENAI_BASE_URL) to measure without API cost."
+    )
+    parser.add_argument("--concurrency", default="1,2,4,8,16,32", help="Comma separated in-flight summary limits")
+    parser.add_argument("--elements", type=int, default=64, help="Number of synthetic elements")
+    parser.add_argument("--pdf", default=None, help="Summarize the elements of this PDF instead")
+    parser.add_argument("--images", default=None, help="Summarize the .jpg figures in this directory instead")
+    parser.add_argument("--workers", type=int, default=IMAGE_WORKERS, help="Image resize processes")
+    args = parser.parse_args()
+
+    if args.images:
+        elements = [f for f in os.listdir(args.images) if f.endswith(".jpg")]
+    elif args.pdf:
+        fpath, _, fname = args.pdf.rpartition("/")
+        elements = load_elements(fpath + "/", fname)
+    else:
+        elements = synthetic_elements(args.elements)
+    print(f"Summarizing {len(elements)} elements")
+
+    baseline = None
+    rows = []
+    for concurrency in [int(c) for c in args.concurrency.split(",")]:
+        # The response cache would turn every level after the first into lookups
+        start = time.perf_counter()
+        if args.images:
+            # One resize process at concurrency 1 approximates the serial loop
+            workers = 1 if concurrency == 1 else args.workers
+            _, summaries = generate_img_summaries(args.images, True, concurrency, workers)
+        else:
+            _, summaries = generate_text_summaries([], elements, bypass_cache=True, max_concurrency=concurrency)
+        elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        rows.append((concurrency, elapsed, len(summaries) / elapsed, baseline / elapsed))
+
+    print(f"\n{'concurrency':>11} {'seconds':>8} {'elem/s':>8} {'speedup':>8}")
+    for concurrency, elapsed, rate, speedup in rows:
+        print(f"{concurrency:>11} {elapsed:>8.2f} {rate:>8.2f} {speedup:>7.1f}x")
@@ -1,14 +1,19 @@
 import os
+import time
 import uuid
+import shutil
 from langchain_chroma import Chroma
 from langchain.embeddings import HuggingFaceEmbeddings
 from langchain.retrievers.multi_vector import MultiVectorRetriever
-from langchain.storage import InMemoryStore
 from langchain_core.documents import Document
 
+from docstore import SQLiteDocStore
 from extractors import process_document
 from summarizers import generate_text_summaries, generate_img_summaries
 
+# Docstore marker written once every summary is indexed and the vector store persisted
+BUILD_COMPLETE = "build_complete"
+
 def initialize_embeddings():
     """Initialize HuggingFace embeddings"""
     return HuggingFaceEmbeddings(
@@ -16,10 +21,17 @@ def initialize_embeddings():
     )
 
 def create_multi_vector_retriever(
-    vectorstore, text_summaries, texts, table_summaries, tables, image_summaries, images
+    vectorstore,
+    text_summaries=None,
+    texts=None,
+    table_summaries=None,
+    tables=None,
+    image_summaries=None,
+    images=None,
+    docstore=None
 ):
     """Create retriever that indexes summaries but returns raw content"""
-    store = InMemoryStore()
+    store = docstore if docstore is not None else SQLiteDocStore()
     id_key = "doc_id"
 
     # Create the multi-vector retriever
@@ -36,25 +48,48 @@ def create_multi_vector_retriever(
             Document(page_content=s, metadata={id_key: doc_ids[i]})
             for i, s in enumerate(doc_summaries)
         ]
-        retriever.vectorstore.add_documents(summary_docs)
+        # Raw content first, so no summary vector ever points at a missing doc_id
         retriever.docstore.mset(list(zip(doc_ids, doc_contents)))
+        retriever.vectorstore.add_documents(summary_docs)
 
-    # Add texts, tables, and images
+    # Add texts, tables, and images, typed so queries never have to sniff the content
     if text_summaries:
-        add_documents(retriever, text_summaries, texts)
+        add_documents(retriever, text_summaries, [
+            Document(page_content=t, metadata={"type": "text"}) for t in texts
+        ])
     if table_summaries:
-        add_documents(retriever, table_summaries, tables)
+        add_documents(retriever, table_summaries, [
+            Document(page_content=t, metadata={"type": "table"}) for t in tables
+        ])
     if image_summaries:
-        add_documents(retriever, image_summaries, images)
+        add_documents(retriever, image_summaries, [
+            Document(page_content=summary, metadata={"type": "image", **image})
+            for summary, image in zip(image_summaries, images)
+        ])
 
     return retriever
 
+def is_build_complete(docstore):
+    """
+    Whether the last build ran to the end. An interrupted build, or one
+    from before typed content and the marker, leaves a partial index.
+    """
+    return docstore.get_meta(BUILD_COMPLETE) is not None
+
 def create_vectorstore():
     """Create or load Chroma vector store with multi-vector retriever"""
     embeddings = initialize_embeddings()
     
-    # Check if Chroma DB exists
+    docstore = SQLiteDocStore()
+    
+    # Check if Chroma DB exists; a partial or outdated index is never served
+    if os.path.exists("./chroma_db") and not is_build_complete(docstore):
+        print(f"Docstore {docstore.path} has no completed build, rebuilding ./chroma_db")
+        shutil.rmtree("./chroma_db")
     if not os.path.exists("./chroma_db"):
+        # Drop raw content and markers left behind by an interrupted build
+        docstore.clear()
+        
         # Load documents
         fpath = "../document/"
         fname = "attention-is-all-you-need-Paper.pdf"
@@ -75,7 +110,7 @@ def create_vectorstore():
         )
         
         # Generate image summaries
-        img_base64_list, image_summaries = generate_img_summaries("figures/")
+        images, image_summaries = generate_img_summaries("figures/")
         
         # Create retriever
         retriever = create_multi_vector_retriever(
@@ -85,11 +120,13 @@ def create_vectorstore():
             table_summaries,
             tables,
             image_summaries,
-            img_base64_list
+            images,
+            docstore
         )
         
-        # Persist the vector store
+        # Persist the vector store, then mark the build complete
         vectorstore.persist()
+        docstore.set_meta(BUILD_COMPLETE, str(time.time()))
         
         return retriever, texts_4k_token, tables
     
@@ -100,15 +137,7 @@ def create_vectorstore():
         persist_directory="./chroma_db"
     )
     
-    # Create retriever with empty summaries for existing store
-    retriever = create_multi_vector_retriever(
-        vectorstore,
-        [],  # No text summaries
-        [],  # No texts
-        [],  # No table summaries
-        [],  # No tables
-        [],  # No image summaries
-        []   # No images
-    )
+    # Raw content is read lazily from the persisted docstore
+    retriever = create_multi_vector_retriever(vectorstore, docstore=docstore)
     
-    return retriever, None, None 
\ No newline at end of file
+    return retriever, None, None
\ No newline at end of file
@@ -0,0 +1,133 @@
+import os
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+from langchain_core.stores import BaseStore
+
+DOCSTORE_PATH = os.getenv("DOCSTORE_PATH", "./docstore.sqlite")
+# Raw chunks, tables and images kept decoded in memory
+DOCSTORE_CACHE_SIZE = int(os.getenv("DOCSTORE_CACHE_SIZE", "128"))
+
+# SQLite limits the number of parameters of one statement
+MAX_QUERY_KEYS = 500
+
+class SQLiteDocStore(BaseStore[str, Any]):
+    """
+    Persistent docstore for the multi-vector retriever.
+
+    Raw content is written to SQLite keyed by doc_id and only read when a
+    retrieved summary points at it; the most recently read values are
+    kept in a small LRU cache. Values are strings or Documents (typed
+    texts, tables and images). A separate meta table holds markers about
+    the store as a whole, such as whether the index build completed.
+    """
+
+    def __init__(self, path: str = DOCSTORE_PATH, cache_size: int = DOCSTORE_CACHE_SIZE):
+        self.path = path
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS docs (key TEXT PRIMARY KEY, kind TEXT, value TEXT)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+
+    @staticmethod
+    def _encode(value: Any) -> Tuple[str, str]:
+        if isinstance(value, Document):
+            return "document", json.dumps({"page_content": value.page_content, "metadata": value.metadata})
+        if isinstance(value, str):
+            return "str", value
+        raise TypeError(f"Unsupported docstore value type: {type(value).__name__}")
+
+    @staticmethod
+    def _decode(kind: str, value: str) -> Any:
+        if kind == "document":
+            return Document(**json.loads(value))
+        return value
+
+    def _remember(self, key: str, value: Any):
+        self._cache[key] = value
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def mget(self, keys: Sequence[str]) -> List[Optional[Any]]:
+        with self._lock:
+            found = {}
+            missing = []
+            for key in keys:
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    found[key] = self._cache[key]
+                else:
+                    missing.append(key)
+
+            # Read the cold keys in as few queries as possible
+            missing = list(dict.fromkeys(missing))
+            for start in range(0, len(missing), MAX_QUERY_KEYS):
+                chunk = missing[start:start + MAX_QUERY_KEYS]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, kind, value FROM docs WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                for key, kind, value in rows:
+                    found[key] = self._decode(kind, value)
+                    self._remember(key, found[key])
+            return [found.get(key) for key in keys]
+
+    def mset(self, key_value_pairs: Sequence[Tuple[str, Any]]) -> None:
+        rows = [(key, *self._encode(value)) for key, value in key_value_pairs]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany("INSERT OR REPLACE INTO docs (key, kind, value) VALUES (?, ?, ?)", rows)
+            self._conn.execute("COMMIT")
+            for key, _, _ in rows:
+                self._cache.pop(key, None)
+
+    def mdelete(self, keys: Sequence[str]) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany("DELETE FROM docs WHERE key = ?", [(key,) for key in keys])
+            self._conn.execute("COMMIT")
+            for key in keys:
+                self._cache.pop(key, None)
+
+    def yield_keys(self, prefix: Optional[str] = None) -> Iterator[str]:
+        with self._lock:
+            if prefix is None:
+                rows = self._conn.execute("SELECT key FROM docs").fetchall()
+            else:
+                # LIKE ignores ASCII case, so compare the leading characters exactly
+                rows = self._conn.execute(
+                    "SELECT key FROM docs WHERE substr(key, 1, ?) = ?", (len(prefix), prefix)
+                ).fetchall()
+        for (key,) in rows:
+            yield key
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    def get_meta(self, name: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row is not None else None
+
+    def set_meta(self, name: str, value: str):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)", (name, value))
+
+    def clear(self):
+        """Drop every document and meta marker"""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.execute("DELETE FROM docs")
+            self._conn.execute("DELETE FROM meta")
+            self._conn.execute("COMMIT")
+            self._cache.clear()
@@ -1,24 +1,75 @@
 import os
+import json
+import hashlib
+from unstructured.chunking.title import chunk_by_title
 from unstructured.partition.pdf import partition_pdf
+from unstructured.staging.base import elements_from_json, elements_to_json
 from langchain_text_splitters import CharacterTextSplitter
 
+# Everything that changes the extracted elements, hashed into the cache key
+PARTITION_SETTINGS = {
+    "extract_images_in_pdf": True,
+    "infer_table_structure": True,
+}
+CHUNKING_SETTINGS = {
+    "max_characters": 4000,
+    "new_after_n_chars": 3800,
+    "combine_text_under_n_chars": 2000,
+}
+EXTRACTION_CACHE_DIR = os.getenv("EXTRACTION_CACHE_DIR", "./extraction_cache")
+
+def extraction_cache_path(path, fname):
+    """Cache file for a PDF, keyed by its content hash and the partition settings"""
+    digest = hashlib.sha256()
+    with open(os.path.join(path, fname), "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    digest.update(json.dumps(PARTITION_SETTINGS, sort_keys=True).encode("utf-8"))
+    stem = os.path.splitext(fname)[0]
+    return os.path.join(EXTRACTION_CACHE_DIR, f"{stem}-{digest.hexdigest()[:16]}.json")
+
+def load_cached_elements(cache_path):
+    """Elements of an earlier run, unless missing or their extracted images are gone"""
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        elements = elements_from_json(filename=cache_path)
+    except Exception as e:
+        print(f"Error reading extraction cache {cache_path}: {str(e)}")
+        return None
+    image_paths = [getattr(element.metadata, "image_path", None) for element in elements]
+    if any(p and not os.path.exists(p) for p in image_paths):
+        return None
+    return elements
+
+def extract_elements_from_pdf(path, fname, use_cache=True):
+    """
+    Partition a PDF once, extracting tables and images, and reuse the
+    elements of an earlier run of the same file and settings.
+    """
+    cache_path = extraction_cache_path(path, fname)
+    if use_cache:
+        elements = load_cached_elements(cache_path)
+        if elements is not None:
+            print(f"Loaded {len(elements)} elements of {fname} from {cache_path}")
+            return elements
+
+    elements = partition_pdf(filename=os.path.join(path, fname), **PARTITION_SETTINGS)
+
+    # Write then rename, so an interrupted run never leaves a truncated cache
+    os.makedirs(EXTRACTION_CACHE_DIR, exist_ok=True)
+    tmp_path = f"{cache_path}.tmp"
+    elements_to_json(elements, filename=tmp_path)
+    os.replace(tmp_path, cache_path)
+    return elements
+
 def extract_tables_from_pdf(path, fname):
     """Extract tables from a PDF file"""
-    return partition_pdf(
-        filename=os.path.join(path, fname),
-        extract_images_in_pdf=True,
-        infer_table_structure=True,
-    )
+    return extract_elements_from_pdf(path, fname)
 
 def extract_text_from_pdf(path, fname):
     """Extract and chunk text from a PDF file"""
-    return partition_pdf(
-        filename=os.path.join(path, fname),
-        chunking_strategy="by_title",
-        max_characters=4000,
-        new_after_n_chars=3800,
-        combine_text_under_n_chars=2000,
-    )
+    return chunk_by_title(extract_elements_from_pdf(path, fname), **CHUNKING_SETTINGS)
 
 def categorize_elements(raw_pdf_elements):
     """Categorize extracted elements from a PDF into tables and texts"""
@@ -33,11 +84,11 @@ def categorize_elements(raw_pdf_elements):
 
 def process_document(fpath, fname):
     """Process a PDF document and return extracted texts and tables"""
-    # Extract tables and texts
-    table_elements = extract_tables_from_pdf(fpath, fname)
-    texts, tables = categorize_elements(table_elements)
+    # One partition pass: tables come from the raw elements, texts from their chunks
+    elements = extract_elements_from_pdf(fpath, fname)
+    _, tables = categorize_elements(elements)
     
-    text_elements = extract_text_from_pdf(fpath, fname)
+    text_elements = chunk_by_title(elements, **CHUNKING_SETTINGS)
     texts, _ = categorize_elements(text_elements)
     
     # Create text splitter
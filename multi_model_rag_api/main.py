@@ -1,19 +1,42 @@
 import os
+import json
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, UploadFile, File, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
 import shutil
 import uvicorn
 
 from db import create_vectorstore
-from search import search_documents, get_answer
+from metrics import MetricsMiddleware, metrics_response, track_stage
+from search import search_documents, get_answer, split_image_text_types, stream_answer
+
+# Built by the lifespan hook, see lifespan()
+retriever = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Build or load the RAG system before serving. This must not run at
+    import time: the image build starts a process pool, and under the
+    spawn start method its workers re-import this module.
+    """
+    global retriever
+    print("Initializing RAG system...")
+    # The build drives its own event loops, so it runs off the server's loop
+    loop = asyncio.get_running_loop()
+    retriever, _, _ = await loop.run_in_executor(None, create_vectorstore)
+    yield
 
 # Initialize FastAPI app
 app = FastAPI(
     title="Multi-Modal RAG API",
     description="API for querying documents with text and image support",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -24,10 +47,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-
-# Initialize the RAG system
-print("Initializing RAG system...")
-retriever, texts, tables = create_vectorstore()
+app.add_middleware(MetricsMiddleware)
 
 # Create uploads directory if it doesn't exist
 os.makedirs("uploads", exist_ok=True)
@@ -35,24 +55,64 @@ os.makedirs("uploads", exist_ok=True)
 class Query(BaseModel):
     question: str
     image_path: Optional[str] = None
+    # Skip the LLM response cache and always call the API
+    bypass_cache: bool = False
 
 class Response(BaseModel):
     answer: str
     has_image: bool = False
 
 @app.post("/query", response_model=Response)
-async def query_endpoint(query: Query):
-    """Process a query and return an answer"""
+def query_endpoint(query: Query):
+    """Process a query and return an answer (blocking work runs in the threadpool)"""
     try:
         # Search for relevant documents
         docs = search_documents(retriever, query.question)
         
         # Get answer using the documents
-        response = get_answer(query.question, docs, query.image_path)
+        response = get_answer(query.question, docs, query.image_path, query.bypass_cache)
         return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
 
+def format_sse(event: str, data) -> str:
+    """Format a server-sent event with a JSON encoded payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/query/stream")
+def query_stream_endpoint(query: Query):
+    """Stream the retrieved context and then the answer tokens as server-sent events"""
+    try:
+        docs = search_documents(retriever, query.question)
+        with track_stage("split_images"):
+            split_docs = split_image_text_types(docs)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
+
+    def event_stream():
+        # Images are only counted here, the base64 payloads stay server side
+        yield format_sse("context", {
+            "texts": split_docs["texts"],
+            "has_image": len(split_docs["images"]) > 0
+        })
+        try:
+            for token in stream_answer(query.question, split_docs):
+                yield format_sse("token", token)
+        except Exception as e:
+            yield format_sse("error", f"Error generating answer: {str(e)}")
+        yield format_sse("done", {})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: per-stage latency, LLM tokens and in-flight requests"""
+    return metrics_response()
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
@@ -0,0 +1,162 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Optional, Tuple
+
+from openai.types.chat import ChatCompletion
+
+from metrics import record_cache
+
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", "./llm_cache.sqlite")
+RESPONSE_CACHE_MAX_MB = float(os.getenv("RESPONSE_CACHE_MAX_MB", "256"))
+# Skip the cache for every call, e.g. after changing a prompt
+RESPONSE_CACHE_BYPASS = os.getenv("RESPONSE_CACHE_BYPASS", "false").lower() in ("1", "true", "yes")
+
+# Request arguments that do not change the response
+UNKEYED_ARGUMENTS = ("timeout", "stream", "stream_options")
+
+class ResponseCache:
+    """
+    Disk-backed LLM response cache in SQLite.
+
+    Entries are keyed on a hash of the model, the parameters and the
+    messages, and evicted least recently used first once the stored
+    responses exceed max_bytes.
+    """
+
+    def __init__(self, path: str = RESPONSE_CACHE_PATH, max_bytes: int = int(RESPONSE_CACHE_MAX_MB * 1024 * 1024)):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, model TEXT, response TEXT, size INTEGER, "
+            "created REAL, accessed REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self.total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(request: dict) -> str:
+        """Hash of everything in the request that shapes the response"""
+        keyed = {name: value for name, value in request.items() if name not in UNKEYED_ARGUMENTS}
+        payload = json.dumps(keyed, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+            return row[0]
+
+    def set(self, key: str, model: str, response: str):
+        size = len(response.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            previous = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, size, created, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, response, size, now, now)
+            )
+            self.total_bytes += size - (previous[0] if previous else 0)
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Drop least recently used entries until 90% of the budget is free"""
+        target = int(self.max_bytes * 0.9)
+        while self.total_bytes > target:
+            rows = self._conn.execute(
+                "SELECT key, size FROM responses ORDER BY accessed LIMIT 64"
+            ).fetchall()
+            if not rows:
+                self.total_bytes = 0
+                break
+            self._conn.execute("BEGIN")
+            for key, size in rows:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.total_bytes -= size
+                if self.total_bytes <= target:
+                    break
+            self._conn.execute("COMMIT")
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self.total_bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+# Process-wide cache, opened on first use
+_cache: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+
+def get_response_cache() -> ResponseCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+    return _cache
+
+def is_cacheable(request: dict) -> bool:
+    """Only deterministic, non-streamed calls are cached"""
+    return request.get("temperature") == 0 and not request.get("stream")
+
+def _lookup(request: dict, bypass: bool) -> Tuple[Optional[str], Optional[ChatCompletion]]:
+    if bypass or RESPONSE_CACHE_BYPASS or not is_cacheable(request):
+        return None, None
+    key = ResponseCache.make_key(request)
+    cached = get_response_cache().get(key)
+    record_cache("llm_response", hits=int(cached is not None), misses=int(cached is None))
+    return key, ChatCompletion.model_validate_json(cached) if cached is not None else None
+
+def _store(key: Optional[str], request: dict, response: ChatCompletion):
+    if key is not None:
+        get_response_cache().set(key, request.get("model", ""), response.model_dump_json())
+
+def cached_chat_completion(client, bypass: bool = False, **request) -> Tuple[ChatCompletion, bool]:
+    """
+    client.chat_completion(**request) served from the response cache when
+    possible. Returns the response and whether it came from the cache.
+    """
+    key, response = _lookup(request, bypass)
+    if response is not None:
+        return response, True
+    response = client.chat_completion(**request)
+    _store(key, request, response)
+    return response, False
+
+async def async_cached_chat_completion(client, bypass: bool = False, **request) -> Tuple[ChatCompletion, bool]:
+    """Async counterpart of cached_chat_completion"""
+    key, response = _lookup(request, bypass)
+    if response is not None:
+        return response, True
+    response = await client.chat_completion(**request)
+    _store(key, request, response)
+    return response, False
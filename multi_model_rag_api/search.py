@@ -1,81 +1,50 @@
 import os
-import base64
-import io
-import re
-from typing import List, Dict, Any
-from openai import OpenAI
+import time
+from typing import List, Dict, Any, Iterator
 from dotenv import load_dotenv
-from PIL import Image
 from langchain_core.documents import Document
 
-load_dotenv()
-client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-
-def encode_image(image_path):
-    """Convert image to base64 string"""
-    with open(image_path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode("utf-8")
-
-def looks_like_base64(sb):
-    """Check if the string looks like base64"""
-    return re.match("^[A-Za-z0-9+/]+[=]{0,2}$", sb) is not None
+from llm_client import get_llm_client
+from metrics import observe_stage, record_llm_usage, track_stage
+from response_cache import cached_chat_completion
 
-def is_image_data(b64data):
-    """Check if the base64 data is an image"""
-    image_signatures = {
-        b"\xff\xd8\xff": "jpg",
-        b"\x89\x50\x4e\x47\x0d\x0a\x1a\x0a": "png",
-        b"\x47\x49\x46\x38": "gif",
-        b"\x52\x49\x46\x46": "webp",
-    }
-    try:
-        header = base64.b64decode(b64data)[:8]
-        for sig, format in image_signatures.items():
-            if header.startswith(sig):
-                return True
-        return False
-    except Exception:
-        return False
+load_dotenv()
 
-def resize_base64_image(base64_string, size=(1300, 600)):
-    """Resize an image encoded as a Base64 string"""
-    img_data = base64.b64decode(base64_string)
-    img = Image.open(io.BytesIO(img_data))
-    resized_img = img.resize(size, Image.LANCZOS)
-    buffered = io.BytesIO()
-    resized_img.save(buffered, format=img.format)
-    return base64.b64encode(buffered.getvalue()).decode("utf-8")
+LLM_MODEL = "gpt-4o-mini"
+# Image variant sent with a question: "high", or "low" for fewer prompt tokens
+IMAGE_DETAIL = os.getenv("IMAGE_DETAIL", "high")
 
 def split_image_text_types(docs):
-    """Split base64-encoded images and texts"""
-    b64_images = []
+    """
+    Split retrieved docs into image data URLs and texts using the type
+    stored at ingest. Images were rendered then, so nothing is decoded or
+    resized here.
+    """
+    images = []
     texts = []
     for doc in docs:
-        if isinstance(doc, Document):
-            doc = doc.page_content
-        if looks_like_base64(doc) and is_image_data(doc):
-            doc = resize_base64_image(doc)
-            b64_images.append(doc)
-        else:
+        if not isinstance(doc, Document):
             texts.append(doc)
-    return {"images": b64_images, "texts": texts}
+        elif doc.metadata.get("type") == "image":
+            variants = doc.metadata["variants"]
+            images.append(variants.get(IMAGE_DETAIL, variants["high"]))
+        else:
+            texts.append(doc.page_content)
+    return {"images": images, "texts": texts}
 
 def search_documents(vectorstore, query: str, k: int = 5):
     """Search for relevant documents using the vector store"""
     try:
         # Use get_relevant_documents instead of similarity_search
-        docs = vectorstore.get_relevant_documents(query, k=k)
+        with track_stage("retrieve"):
+            docs = vectorstore.get_relevant_documents(query, k=k)
         return docs
     except Exception as e:
         print(f"Error searching documents: {str(e)}")
         raise
 
-def get_answer(query: str, docs: List[Document], image_path: str = None) -> Dict[str, Any]:
-    """Generate an answer using OpenAI API"""
-    # Split documents into images and texts
-    split_docs = split_image_text_types(docs)
-    
-    # Prepare messages for OpenAI API
+def build_messages(query: str, split_docs: Dict[str, List[str]]) -> List[Dict[str, Any]]:
+    """Build the chat messages from the query and the split documents"""
     messages = []
     
     # Add system message
@@ -99,7 +68,7 @@ def get_answer(query: str, docs: List[Document], image_path: str = None) -> Dict
                     },
                     {
                         "type": "image_url",
-                        "image_url": {"url": f"data:image/jpeg;base64,{image}"}
+                        "image_url": {"url": image, "detail": IMAGE_DETAIL}
                     }
                 ]
             })
@@ -116,15 +85,52 @@ Context:
 Please provide a detailed, technical explanation that helps understand the paper's concepts in relation to the question."""
     })
     
+    return messages
+
+def get_answer(query: str, docs: List[Document], image_path: str = None, bypass_cache: bool = False) -> Dict[str, Any]:
+    """Generate an answer using OpenAI API, reusing cached answers to identical prompts"""
+    # Split documents into images and texts
+    with track_stage("split_images"):
+        split_docs = split_image_text_types(docs)
+    
     # Call OpenAI API
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=messages,
-        max_tokens=1024,
-        temperature=0
-    )
+    with track_stage("llm"):
+        response, cached = cached_chat_completion(
+            get_llm_client(),
+            bypass=bypass_cache,
+            model=LLM_MODEL,
+            messages=build_messages(query, split_docs),
+            max_tokens=1024,
+            temperature=0
+        )
+    # A cached answer spent no tokens
+    if not cached:
+        record_llm_usage(LLM_MODEL, response.usage)
     
     return {
         "answer": response.choices[0].message.content,
         "has_image": len(split_docs["images"]) > 0
-    } 
\ No newline at end of file
+    }
+
+def stream_answer(query: str, split_docs: Dict[str, List[str]]) -> Iterator[str]:
+    """Stream the answer token by token as the OpenAI API produces it"""
+    start = time.perf_counter()
+    first_token = True
+    stream = get_llm_client().chat_completion(
+        model=LLM_MODEL,
+        messages=build_messages(query, split_docs),
+        max_tokens=1024,
+        temperature=0,
+        stream=True,
+        stream_options={"include_usage": True}
+    )
+    
+    for chunk in stream:
+        if chunk.usage:
+            record_llm_usage(LLM_MODEL, chunk.usage)
+        if chunk.choices and chunk.choices[0].delta.content:
+            if first_token:
+                observe_stage("llm_first_token", time.perf_counter() - start)
+                first_token = False
+            yield chunk.choices[0].delta.content
+    observe_stage("llm", time.perf_counter() - start)
\ No newline at end of file
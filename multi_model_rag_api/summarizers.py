@@ -1,17 +1,33 @@
 import os
+import time
 import asyncio
 import base64
 from PIL import Image
 import io
-from openai import OpenAI
+from concurrent.futures import ProcessPoolExecutor
 from dotenv import load_dotenv
 
+from llm_client import AsyncLLMClient
+from response_cache import async_cached_chat_completion
+
 load_dotenv()
-client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
 
-async def summarize_element(element):
+# Summaries requested at once while building the index
+SUMMARY_CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", "8"))
+# Extra passes over the elements whose summary failed after the client's own retries
+SUMMARY_RETRY_ROUNDS = int(os.getenv("SUMMARY_RETRY_ROUNDS", "2"))
+# Processes decoding and resizing figures, and the largest size they are sent at
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", str(os.cpu_count() or 1)))
+IMAGE_SIZE = (1300, 600)
+# Size-bounded renditions stored at ingest; "low" matches the API's low-detail 512px tile
+IMAGE_VARIANTS = {"high": IMAGE_SIZE, "low": (512, 512)}
+IMAGE_JPEG_QUALITY = 85
+
+async def summarize_element(client: AsyncLLMClient, element, bypass_cache=False):
     """Summarize a single element using OpenAI API"""
-    response = client.chat.completions.create(
+    response, _ = await async_cached_chat_completion(
+        client,
+        bypass=bypass_cache,
         model="gpt-4o-mini",
         temperature=0,
         messages=[
@@ -21,18 +37,89 @@ async def summarize_element(element):
     )
     return response.choices[0].message.content
 
-async def process_batch(elements, max_concurrency=5):
-    """Process a batch of elements with concurrency control"""
+class SummaryProgress:
+    """Prints how many elements are summarized, roughly every 10%"""
+
+    def __init__(self, total, label):
+        self.total = total
+        self.label = label
+        self.done = 0
+        self.failed = 0
+        self.start = time.perf_counter()
+        self.step = max(1, total // 10)
+
+    def update(self, failed=False):
+        self.done += 1
+        self.failed += failed
+        if self.done % self.step == 0 or self.done == self.total:
+            rate = self.done / max(time.perf_counter() - self.start, 1e-9)
+            print(f"Summarized {self.done}/{self.total} {self.label} ({rate:.1f}/s, {self.failed} failed)")
+
+async def summarize_with_retries(count, summarize, label, retry_rounds=SUMMARY_RETRY_ROUNDS):
+    """
+    Run the async summarize(i) for every index concurrently, then re-run
+    only the indices that failed. Returns the summaries (None where every
+    attempt failed) and the failed indices.
+    """
+    summaries = [None] * count
+
+    async def run(i, progress):
+        try:
+            summaries[i] = await summarize(i)
+        except Exception:
+            progress.update(failed=True)
+            raise
+        progress.update()
+
+    pending = list(range(count))
+    for attempt in range(retry_rounds + 1):
+        progress = SummaryProgress(len(pending), label)
+        results = await asyncio.gather(*(run(i, progress) for i in pending), return_exceptions=True)
+        errors = {i: r for i, r in zip(pending, results) if isinstance(r, Exception)}
+        pending = list(errors)
+        if not pending:
+            break
+        first_error = next(iter(errors.values()))
+        print(f"Error summarizing {len(pending)} {label}: {type(first_error).__name__}: {str(first_error)}")
+        if attempt < retry_rounds:
+            print(f"Retrying {len(pending)} failed {label}")
+    return summaries, pending
+
+async def process_batch(
+    elements,
+    max_concurrency=SUMMARY_CONCURRENCY,
+    bypass_cache=False,
+    retry_rounds=SUMMARY_RETRY_ROUNDS,
+    label="elements"
+):
+    """Summarize elements concurrently, retrying only the ones that failed"""
     semaphore = asyncio.Semaphore(max_concurrency)
+    # The async connection pool belongs to this event loop, so it is not shared
+    client = AsyncLLMClient()
     
-    async def process_with_semaphore(element):
+    async def process_with_semaphore(i):
         async with semaphore:
-            return await summarize_element(element)
+            return await summarize_element(client, elements[i], bypass_cache)
+    
+    try:
+        summaries, failed = await summarize_with_retries(len(elements), process_with_semaphore, label, retry_rounds)
+    finally:
+        await client.aclose()
     
-    tasks = [process_with_semaphore(element) for element in elements]
-    return await asyncio.gather(*tasks)
+    # Index the raw element rather than dropping it when its summary keeps failing
+    if failed:
+        print(f"Using the raw content of {len(failed)} {label} as their summaries")
+    for i in failed:
+        summaries[i] = str(elements[i])
+    return summaries
 
-def generate_text_summaries(texts, tables, summarize_texts=False):
+def generate_text_summaries(
+    texts,
+    tables,
+    summarize_texts=False,
+    bypass_cache=False,
+    max_concurrency=SUMMARY_CONCURRENCY
+):
     """Summarize text elements"""
     # Initialize empty summaries
     text_summaries = []
@@ -44,76 +131,142 @@ def generate_text_summaries(texts, tables, summarize_texts=False):
 
     # Apply to text if texts are provided and summarization is requested
     if texts and summarize_texts:
-        text_summaries = loop.run_until_complete(process_batch(texts, max_concurrency=5))
+        text_summaries = loop.run_until_complete(
+            process_batch(texts, max_concurrency, bypass_cache, label="texts")
+        )
     elif texts:
         text_summaries = texts
 
     # Apply to tables if tables are provided
     if tables:
-        table_summaries = loop.run_until_complete(process_batch(tables, max_concurrency=5))
+        table_summaries = loop.run_until_complete(
+            process_batch(tables, max_concurrency, bypass_cache, label="tables")
+        )
 
     loop.close()
     return text_summaries, table_summaries
 
-def encode_image(image_path):
-    """Convert image to base64 string"""
-    with open(image_path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode("utf-8")
-
-def resize_base64_image(base64_string, size=(1300, 600)):
-    """Resize a base64 encoded image"""
-    # Decode base64 string to image
-    img_data = base64.b64decode(base64_string)
-    img = Image.open(io.BytesIO(img_data))
-    
-    # Resize image
-    img = img.resize(size, Image.Resampling.LANCZOS)
-    
-    # Convert back to base64
+def render_variant(img, size, quality=IMAGE_JPEG_QUALITY):
+    """JPEG data URL of img scaled down, keeping its aspect ratio, to fit within size"""
+    variant = img.copy()
+    variant.thumbnail(size, Image.Resampling.LANCZOS)
     buffered = io.BytesIO()
-    img.save(buffered, format="JPEG")
-    return base64.b64encode(buffered.getvalue()).decode("utf-8")
+    variant.save(buffered, format="JPEG", quality=quality)
+    return f"data:image/jpeg;base64,{base64.b64encode(buffered.getvalue()).decode('utf-8')}"
+
+def prepare_image(img_path, variants=IMAGE_VARIANTS):
+    """
+    Read an image and render every size-bounded variant. Runs in a worker
+    process, so it works on the raw file bytes and encodes each variant
+    exactly once; queries later send a variant as is.
+    """
+    with open(img_path, "rb") as f:
+        img = Image.open(io.BytesIO(f.read()))
+        img.load()
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    return {
+        "source": os.path.basename(img_path),
+        "mime_type": "image/jpeg",
+        "variants": {name: render_variant(img, size) for name, size in variants.items()},
+    }
 
-def image_summarize(img_base64, prompt):
-    """Generate image summary using OpenAI API"""
-    response = client.chat.completions.create(
+def image_messages(image_url, prompt):
+    """Chat messages asking for the summary of one image"""
+    return [
+        {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": prompt},
+                {
+                    "type": "image_url",
+                    "image_url": {"url": image_url},
+                },
+            ]
+        }
+    ]
+
+async def summarize_image(client: AsyncLLMClient, image_url, prompt, bypass_cache=False):
+    """Summarize one image, given as a data URL, using OpenAI API"""
+    # temperature=0 makes the summary deterministic, and so cacheable
+    response, _ = await async_cached_chat_completion(
+        client,
+        bypass=bypass_cache,
         model="gpt-4o-mini",
         max_tokens=1024,
-        messages=[
-            {
-                "role": "user",
-                "content": [
-                    {"type": "text", "text": prompt},
-                    {
-                        "type": "image_url",
-                        "image_url": {"url": f"data:image/jpeg;base64,{img_base64}"},
-                    },
-                ]
-            }
-        ]
+        temperature=0,
+        messages=image_messages(image_url, prompt)
     )
     return response.choices[0].message.content
 
-def generate_img_summaries(path):
-    """Generate summaries and base64 encoded strings for images"""
-    # Store base64 encoded images
-    img_base64_list = []
-    # Store image summaries
-    image_summaries = []
+async def process_images(
+    img_paths,
+    prompt,
+    max_concurrency=SUMMARY_CONCURRENCY,
+    workers=IMAGE_WORKERS,
+    bypass_cache=False,
+    retry_rounds=SUMMARY_RETRY_ROUNDS
+):
+    """
+    Resize images in a process pool and summarize each one as soon as it
+    is ready, so decoding overlaps with the summary requests in flight.
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(max_concurrency)
+    client = AsyncLLMClient()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Every image is submitted up front; a summary only waits for its own image
+        prepared = [loop.run_in_executor(pool, prepare_image, path) for path in img_paths]
+
+        unreadable = set()
 
+        async def process_with_semaphore(i):
+            # A figure that cannot be decoded fails the same way every pass, so it is not retried
+            try:
+                image = await prepared[i]
+            except Exception as e:
+                if i not in unreadable:
+                    unreadable.add(i)
+                    print(f"Error preparing image {img_paths[i]}: {str(e)}")
+                return None
+            async with semaphore:
+                return await summarize_image(client, image["variants"]["high"], prompt, bypass_cache)
+
+        try:
+            summaries, failed = await summarize_with_retries(len(img_paths), process_with_semaphore, "images", retry_rounds)
+        finally:
+            await client.aclose()
+
+    # An image that could not be read or summarized is left out of the index
+    failed = set(failed) | unreadable
+    keep = [i for i in range(len(img_paths)) if i not in failed]
+    if len(keep) < len(img_paths):
+        print(f"Skipping {len(img_paths) - len(keep)} images that could not be processed")
+    return [prepared[i].result() for i in keep], [summaries[i] for i in keep]
+
+def generate_img_summaries(
+    path,
+    bypass_cache=False,
+    max_concurrency=SUMMARY_CONCURRENCY,
+    workers=IMAGE_WORKERS
+):
+    """Generate summaries and the pre-rendered variants of the images"""
     # Prompt for image summarization
     prompt = """You are an assistant tasked with summarizing images for retrieval. \
     These summaries will be embedded and used to retrieve the raw image. \
     Give a concise summary of the image that is well optimized for retrieval."""
 
-    # Process each image in the directory
-    for img_file in sorted(os.listdir(path)):
-        if img_file.endswith(".jpg"):
-            img_path = os.path.join(path, img_file)
-            base64_image = encode_image(img_path)
-            # Resize image to optimize for API
-            base64_image = resize_base64_image(base64_image)
-            img_base64_list.append(base64_image)
-            image_summaries.append(image_summarize(base64_image, prompt))
-
-    return img_base64_list, image_summaries 
\ No newline at end of file
+    img_paths = [os.path.join(path, f) for f in sorted(os.listdir(path)) if f.endswith(".jpg")]
+    if not img_paths:
+        return [], []
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        # Returns the prepared images and their summaries, in file name order
+        return loop.run_until_complete(
+            process_images(img_paths, prompt, max_concurrency, workers, bypass_cache)
+        )
+    finally:
+        loop.close()
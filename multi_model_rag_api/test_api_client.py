@@ -1,43 +1,133 @@
-import requests
+import argparse
+import asyncio
 import json
+import time
+from typing import List, Optional
 
-def test_api():
-    """Test the API endpoints"""
-    base_url = "http://localhost:8000"
-    
-    # Test health endpoint
-    print("Testing health endpoint...")
-    response = requests.get(f"{base_url}/health")
-    print(f"Health check response: {response.json()}")
-    
-    # Test queries
-    test_queries = [
-        "What is multi-head attention?",
-        "Explain the transformer architecture.",
-        "What are the key components of the transformer model?",
-        "How does the transformer handle sequence transduction?",
-        "What are the advantages of the transformer over RNNs?"
-    ]
-    
-    print("\nTesting queries...")
-    for query in test_queries:
-        print(f"\nQuery: {query}")
-        print("-" * 80)
-        
-        # Send query to API
-        response = requests.post(
-            f"{base_url}/query",
-            json={"question": query}
+import httpx
+import numpy as np
+
+TEST_QUERIES = [
+    "What is multi-head attention?",
+    "Explain the transformer architecture.",
+    "What are the key components of the transformer model?",
+    "How does the transformer handle sequence transduction?",
+    "What are the advantages of the transformer over RNNs?"
+]
+
+async def send_query(client: httpx.AsyncClient, path: str, question: str, stream: bool) -> Optional[float]:
+    """
+    Send one query and return the time to the first answer token for
+    streamed requests (None otherwise). Raises on HTTP errors.
+    """
+    start = time.perf_counter()
+    if not stream:
+        response = await client.post(path, json={"question": question})
+        response.raise_for_status()
+        return None
+
+    first_token = None
+    async with client.stream("POST", path, json={"question": question}) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if first_token is None and line == "event: token":
+                first_token = time.perf_counter() - start
+            if line == "event: error":
+                raise RuntimeError("Server reported an error while streaming")
+    return first_token
+
+async def run_level(
+    base_url: str,
+    path: str,
+    concurrency: int,
+    total: int,
+    stream: bool,
+    timeout: float
+) -> dict:
+    """Send `total` queries with at most `concurrency` in flight"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    first_tokens: List[float] = []
+    errors: List[str] = []
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        async def one(i: int):
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    first_token = await send_query(client, path, TEST_QUERIES[i % len(TEST_QUERIES)], stream)
+                except Exception as e:
+                    errors.append(type(e).__name__)
+                    return
+                latencies.append(time.perf_counter() - start)
+                if first_token is not None:
+                    first_tokens.append(first_token)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - start
+
+    def pct(values, p):
+        return float(np.percentile(values, p)) if values else float("nan")
+
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": len(errors),
+        "error_rate": len(errors) / total if total else 0.0,
+        "error_types": sorted(set(errors)),
+        "qps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_s": pct(latencies, 50),
+        "p95_s": pct(latencies, 95),
+        "p99_s": pct(latencies, 99),
+        "ttft_p50_s": pct(first_tokens, 50),
+    }
+
+async def main(args):
+    """Check the service is up, then load test it at each concurrency level"""
+    async with httpx.AsyncClient(base_url=args.url, timeout=10) as client:
+        response = await client.get(args.health_path)
+        print(f"Health check response: {response.json()}")
+
+    path = "/query/stream" if args.stream else "/query"
+    print(f"\nLoad testing {args.url}{path} with {args.requests} requests per level")
+    header = f"{'conc':>5} {'qps':>8} {'err%':>6} {'p50(s)':>8} {'p95(s)':>8} {'p99(s)':>8}"
+    print(header + (f" {'ttft50(s)':>10}" if args.stream else ""))
+
+    results = []
+    for level in [int(level) for level in args.levels.split(",")]:
+        result = await run_level(args.url, path, level, args.requests, args.stream, args.timeout)
+        results.append(result)
+        line = (
+            f"{level:>5} {result['qps']:>8.2f} {result['error_rate'] * 100:>5.1f}% "
+            f"{result['p50_s']:>8.2f} {result['p95_s']:>8.2f} {result['p99_s']:>8.2f}"
         )
-        
-        if response.status_code == 200:
-            result = response.json()
-            print(f"Answer: {result['answer']}")
-        else:
-            print(f"Error: {response.status_code}")
-            print(response.text)
-        
-        print("-" * 80)
+        if args.stream:
+            line += f" {result['ttft_p50_s']:>10.2f}"
+        if result["error_types"]:
+            line += f"  errors: {', '.join(result['error_types'])}"
+        print(line)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nSaved results to {args.output}")
 
 if __name__ == "__main__":
-    test_api() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(
+        description="Concurrent load test for the RAG API",
+        epilog="Run the service against benchmarks/fake_llm.py (OPENAI_BASE_URL) to test without API cost."
+    )
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--levels", default="1,2,4,8,16,32", help="Comma separated in-flight request counts")
+    parser.add_argument("--requests", type=int, default=50, help="Requests sent per concurrency level")
+    parser.add_argument("--stream", action="store_true", help="Use /query/stream and report time to first token")
+    parser.add_argument(
+        "--health-path",
+        default="/health",
+        help="Checked before the run; naive_rag and retrieve_and_rerank serve /health/ready"
+    )
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--output", default=None, help="Write the results as JSON")
+    asyncio.run(main(parser.parse_args()))
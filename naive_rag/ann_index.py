@@ -0,0 +1,204 @@
+import os
+import json
+from typing import Collection, List, Optional
+
+import numpy as np
+
+# Rows scored against the centroids at a time during assignment
+ASSIGN_BLOCK_ROWS = 65536
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.clip(norms, 1e-12, None)
+
+def _write_npy(path: str, array: np.ndarray):
+    """Write an array next to its final path and atomically swap it in"""
+    tmp_path = f"{path}.tmp.npy"
+    np.save(tmp_path, array)
+    os.replace(tmp_path, path)
+
+def default_nlist(n: int) -> int:
+    """Rule-of-thumb list count of about 4 * sqrt(n)"""
+    return max(1, int(4 * np.sqrt(n)))
+
+class IVFIndex:
+    """
+    Inverted-file (IVF) index over normalized vectors.
+
+    Build clusters the vectors into nlist cells with spherical k-means and
+    records, per cell, the row ids assigned to it. A search scores the
+    query against the centroids and only visits the rows of the nprobe
+    closest cells, so its cost grows with n * nprobe / nlist instead of n.
+    The index only stores row ids; the vectors stay in the caller's matrix.
+
+    update() carries the index over to a changed set of rows without
+    re-clustering: surviving rows keep their cell and new rows join the
+    closest centroid, until the rows changed since the last build exceed
+    max_drift of the rows it was trained on.
+    """
+
+    def __init__(
+        self,
+        nlist: Optional[int] = None,
+        nprobe: int = 8,
+        kmeans_iters: int = 10,
+        max_train_rows: int = 100000,
+        seed: int = 0
+    ):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.kmeans_iters = kmeans_iters
+        self.max_train_rows = max_train_rows
+        self.seed = seed
+        self.centroids: Optional[np.ndarray] = None
+        self.list_rows: Optional[np.ndarray] = None
+        self.list_offsets: Optional[np.ndarray] = None
+        # Rows at the last k-means build and rows added or removed since
+        self.n_trained = 0
+        self.n_changed = 0
+
+    @property
+    def n_rows(self) -> int:
+        return 0 if self.list_rows is None else len(self.list_rows)
+
+    def _assign(self, vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        """Closest centroid of every row, computed block by block"""
+        assignment = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), ASSIGN_BLOCK_ROWS):
+            block = np.asarray(vectors[start:start + ASSIGN_BLOCK_ROWS], dtype=np.float32)
+            assignment[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+        return assignment
+
+    def build(self, vectors: np.ndarray) -> "IVFIndex":
+        """Train centroids on a sample of the rows and fill the inverted lists"""
+        n = len(vectors)
+        nlist = min(self.nlist or default_nlist(n), n)
+        rng = np.random.default_rng(self.seed)
+
+        # Spherical k-means on a training sample
+        sample_rows = np.sort(rng.choice(n, size=min(n, max(self.max_train_rows, nlist)), replace=False))
+        sample = _normalize(np.asarray(vectors[sample_rows], dtype=np.float32))
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(self.kmeans_iters):
+            assignment = self._assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            counts = np.bincount(assignment, minlength=nlist)
+            empty = counts == 0
+            # Re-seed empty cells with random sample rows
+            sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+            centroids = _normalize(sums)
+
+        self.centroids = centroids
+        self.nlist = nlist
+        self._fill_lists(self._assign(vectors, centroids))
+        self.n_trained = n
+        self.n_changed = 0
+        return self
+
+    def _fill_lists(self, assignment: np.ndarray):
+        """Inverted lists: row ids grouped by cell, with offsets into them"""
+        self.list_rows = np.argsort(assignment, kind="stable").astype(np.int64)
+        self.list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=self.nlist))])
+
+    def cells(self) -> np.ndarray:
+        """Cell of every row"""
+        assignment = np.empty(self.n_rows, dtype=np.int32)
+        assignment[self.list_rows] = np.repeat(np.arange(self.nlist, dtype=np.int32), np.diff(self.list_offsets))
+        return assignment
+
+    def update(
+        self,
+        old_ids: List[str],
+        new_ids: List[str],
+        vectors: np.ndarray,
+        changed: Collection[str] = (),
+        max_drift: float = 0.2
+    ) -> Optional["IVFIndex"]:
+        """
+        Index over new_ids (rows of vectors) reusing these centroids, or None
+        when the change would exceed max_drift and the caller should build.
+        Rows whose id is in changed are treated as new even if the id existed.
+        """
+        old_rows = {doc_id: row for row, doc_id in enumerate(old_ids)}
+        kept = [(row, old_rows[doc_id]) for row, doc_id in enumerate(new_ids)
+                if doc_id in old_rows and doc_id not in changed]
+        added = np.setdiff1d(np.arange(len(new_ids)), [row for row, _ in kept]).astype(np.int64)
+        removed = len(set(old_ids).difference(new_ids))
+        n_changed = self.n_changed + len(added) + removed
+        if n_changed > max_drift * self.n_trained:
+            return None
+
+        old_cells = self.cells()
+        assignment = np.empty(len(new_ids), dtype=np.int32)
+        if kept:
+            new_rows, previous_rows = np.array(kept, dtype=np.int64).T
+            assignment[new_rows] = old_cells[previous_rows]
+        if len(added):
+            assignment[added] = self._assign(_normalize(np.asarray(vectors[added], dtype=np.float32)), self.centroids)
+
+        index = IVFIndex(self.nlist, self.nprobe, self.kmeans_iters, self.max_train_rows, self.seed)
+        index.centroids = self.centroids
+        index._fill_lists(assignment)
+        index.n_trained = self.n_trained
+        index.n_changed = n_changed
+        return index
+
+    def probe(self, query: np.ndarray, nprobe: Optional[int] = None) -> np.ndarray:
+        """Row ids in the nprobe cells closest to the query"""
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        centroid_scores = self.centroids @ query
+        cells = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        return np.concatenate([
+            self.list_rows[self.list_offsets[cell]:self.list_offsets[cell + 1]] for cell in cells
+        ])
+
+    def search(self, vectors: np.ndarray, query: np.ndarray, k: int, nprobe: Optional[int] = None):
+        """Approximate top-k rows and scores, best first"""
+        rows = self.probe(query, nprobe)
+        if len(rows) == 0:
+            return rows, np.array([], dtype=np.float32)
+        rows.sort()
+        scores = np.asarray(vectors[rows], dtype=np.float32) @ query
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return rows[top], scores[top]
+
+    def save(self, directory: str, fingerprint: str = ""):
+        """
+        Persist centroids and inverted lists next to the vectors. Every file
+        is swapped in atomically, since live snapshots memory-map the rows,
+        and ivf.json is written last to mark the index complete.
+        """
+        _write_npy(os.path.join(directory, "ivf_centroids.npy"), self.centroids)
+        _write_npy(os.path.join(directory, "ivf_rows.npy"), self.list_rows)
+        _write_npy(os.path.join(directory, "ivf_offsets.npy"), self.list_offsets)
+        meta_path = os.path.join(directory, "ivf.json")
+        with open(f"{meta_path}.tmp", "w") as f:
+            json.dump({
+                "nlist": self.nlist,
+                "n_rows": self.n_rows,
+                "n_trained": self.n_trained,
+                "n_changed": self.n_changed,
+                "fingerprint": fingerprint
+            }, f)
+        os.replace(f"{meta_path}.tmp", meta_path)
+
+    @classmethod
+    def load(cls, directory: str, nprobe: int = 8, fingerprint: str = "") -> Optional["IVFIndex"]:
+        """Load a persisted index, or None if missing or built for other rows"""
+        meta_path = os.path.join(directory, "ivf.json")
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta.get("fingerprint") != fingerprint:
+            return None
+        index = cls(nlist=meta["nlist"], nprobe=nprobe)
+        index.centroids = np.load(os.path.join(directory, "ivf_centroids.npy"))
+        index.list_rows = np.load(os.path.join(directory, "ivf_rows.npy"), mmap_mode="r")
+        index.list_offsets = np.load(os.path.join(directory, "ivf_offsets.npy"))
+        index.n_trained = meta.get("n_trained", meta["n_rows"])
+        index.n_changed = meta.get("n_changed", 0)
+        return index
@@ -1,39 +1,166 @@
+import os
+import json
+import time
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import List
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import List, Optional
 
-from db import create_vectorstore
-from search import search_documents, get_answer
+from context_builder import get_encoder
+from db import create_vectorstore, initialize_embeddings, sync_vectorstore
+from metrics import MetricsMiddleware, metrics_response, record_cache, track_stage
+from search import (
+    search_documents,
+    search_documents_async,
+    search_documents_batch_async,
+    get_answer,
+    get_client,
+    get_lexical_index,
+    stream_answer,
+    search_executor,
+    ANSWER_ERROR_MESSAGE
+)
+from semantic_cache import SemanticCache
+
+CORPUS_NAME = os.getenv("CORPUS_NAME", "default")
+
+# Limits for /query/batch
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "256"))
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "8"))
+
+# Loaded by the lifespan hook, see initialize()
+vectorstore = None
+semantic_cache: Optional[SemanticCache] = None
+startup = {"ready": False, "error": None, "seconds": {}}
+
+def timed_step(name: str, fn, *args):
+    """Run one startup step and record how long it took"""
+    start = time.perf_counter()
+    result = fn(*args)
+    startup["seconds"][name] = round(time.perf_counter() - start, 3)
+    return result
+
+def initialize():
+    """
+    Load models and the index, then run warm-up inference so the first
+    real query does not pay for it.
+    """
+    global vectorstore, semantic_cache
+    embeddings = timed_step("embeddings", initialize_embeddings)
+    vectorstore = timed_step("vectorstore", create_vectorstore, None, embeddings)
+    timed_step("lexical_index", get_lexical_index, vectorstore)
+    timed_step("llm_client", get_client)
+    timed_step("tokenizer", get_encoder)
+
+    # Semantic answer cache, sharing the vector store's embedding model
+    semantic_cache = SemanticCache(
+        embeddings,
+        threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92")),
+        max_entries=int(os.getenv("SEMANTIC_CACHE_SIZE", "1000")),
+        ttl_seconds=float(os.getenv("SEMANTIC_CACHE_TTL", "86400"))
+    )
+
+    timed_step("warmup_embedding", embeddings.embed_query, "warm up")
+    timed_step("warmup_search", search_documents, vectorstore, "warm up", 1)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Start loading in the background so liveness checks answer immediately;
+    readiness flips once initialize() completes.
+    """
+    async def load():
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        try:
+            await loop.run_in_executor(None, initialize)
+            startup["ready"] = True
+        except Exception as e:
+            startup["error"] = str(e)
+            print(f"Error during startup: {str(e)}")
+        startup["seconds"]["total"] = round(time.perf_counter() - start, 3)
+
+    task = asyncio.create_task(load())
+    yield
+    task.cancel()
 
 # Initialize FastAPI app
 app = FastAPI(
     title="RAG Query API",
     description="API for answering questions using RAG system",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
+app.add_middleware(MetricsMiddleware)
 
-# Initialize vector store
-vectorstore = create_vectorstore()
+def require_ready():
+    """
+    Reject requests until models and index are loaded.
+    """
+    if not startup["ready"]:
+        raise HTTPException(status_code=503, detail="Service is starting up")
 
 class Query(BaseModel):
     question: str
     k: int = 5
+    hybrid: bool = False
 
 class Response(BaseModel):
     answer: str
     context: List[str]
+    cached: bool = False
+
+class BatchQuery(BaseModel):
+    questions: List[str]
+    k: int = Field(5, ge=1)
+    hybrid: bool = False
+
+class BatchResponse(BaseModel):
+    results: List[Response]
+
+async def lookup_cache(query: Query):
+    """
+    Embed the question off the event loop and look it up in the semantic cache.
+    Returns the cache hit (or None) and the question vector for a later store.
+    """
+    if semantic_cache.max_entries == 0:
+        return None, None
+    loop = asyncio.get_running_loop()
+    with track_stage("cache_lookup"):
+        vector = await loop.run_in_executor(search_executor, semantic_cache.embed, query.question)
+        hit = semantic_cache.lookup(query.question, CORPUS_NAME, (query.k, query.hybrid), vector=vector)
+    record_cache("semantic_answer", hits=int(hit is not None), misses=int(hit is None))
+    return hit, vector
+
+def store_in_cache(query: Query, answer: str, context: List[str], vector):
+    """
+    Cache a successful answer; failed searches and LLM errors are not cached.
+    """
+    if context and not answer.endswith(ANSWER_ERROR_MESSAGE):
+        semantic_cache.store(query.question, answer, context, CORPUS_NAME, (query.k, query.hybrid), vector=vector)
 
 @app.post("/query", response_model=Response)
 async def answer_query(query: Query):
     """
     Endpoint to answer questions using the RAG system.
     """
+    require_ready()
     try:
+        # Serve near-duplicate questions from the semantic cache
+        hit, vector = await lookup_cache(query)
+        if hit is not None:
+            return Response(answer=hit["answer"], context=hit["context"], cached=True)
+
         # Get relevant context
-        context = search_documents(vectorstore, query.question, query.k)
+        context = await search_documents_async(
+            vectorstore, query.question, query.k, query.hybrid
+        )
         
         # Generate answer
-        answer = get_answer(query.question, context)
+        answer = await get_answer(query.question, context)
+        store_in_cache(query, answer, context, vector)
         
         return Response(
             answer=answer,
@@ -46,6 +173,153 @@ async def answer_query(query: Query):
             detail=f"Error processing query: {str(e)}"
         )
 
+@app.post("/query/batch", response_model=BatchResponse)
+async def answer_batch(batch: BatchQuery):
+    """
+    Answer many questions in one request. All questions are embedded in one
+    forward pass and searched together, then the LLM calls run concurrently
+    with at most BATCH_LLM_CONCURRENCY in flight. Results keep the order of
+    the questions. The semantic cache is not consulted.
+    """
+    require_ready()
+    if len(batch.questions) > BATCH_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {BATCH_MAX_QUESTIONS} questions per batch"
+        )
+    try:
+        contexts = await search_documents_batch_async(
+            vectorstore, batch.questions, batch.k, batch.hybrid
+        )
+
+        semaphore = asyncio.Semaphore(BATCH_LLM_CONCURRENCY)
+
+        async def answer(question: str, context: List[str]) -> Response:
+            async with semaphore:
+                return Response(answer=await get_answer(question, context), context=context)
+
+        results = await asyncio.gather(*(
+            answer(question, context) for question, context in zip(batch.questions, contexts)
+        ))
+        return BatchResponse(results=results)
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error processing batch: {str(e)}"
+        )
+
+def format_sse(event: str, data) -> str:
+    """
+    Format a server-sent event with a JSON encoded payload.
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/query/stream")
+async def stream_query(query: Query):
+    """
+    Streaming variant of /query using server-sent events.
+    Emits one `context` event with the retrieved documents, then a `token`
+    event per generated chunk and a final `done` event.
+    """
+    require_ready()
+    try:
+        hit, vector = await lookup_cache(query)
+        context = hit["context"] if hit is not None else await search_documents_async(
+            vectorstore, query.question, query.k, query.hybrid
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error processing query: {str(e)}"
+        )
+
+    async def event_stream():
+        yield format_sse("context", context)
+        if hit is not None:
+            yield format_sse("token", hit["answer"])
+        else:
+            tokens = []
+            async for token in stream_answer(query.question, context):
+                tokens.append(token)
+                yield format_sse("token", token)
+            store_in_cache(query, "".join(tokens), context, vector)
+        yield format_sse("done", {"cached": hit is not None})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """
+    Hit-rate counters for the semantic answer cache.
+    """
+    require_ready()
+    return semantic_cache.stats()
+
+@app.post("/cache/invalidate")
+async def invalidate_cache(corpus: Optional[str] = None):
+    """
+    Drop cached answers for a corpus (all corpora when omitted),
+    e.g. after its documents were re-indexed.
+    """
+    require_ready()
+    return {"invalidated": semantic_cache.invalidate(corpus)}
+
+# Serializes index syncs triggered through the API
+sync_lock = asyncio.Lock()
+
+@app.post("/index/sync")
+async def sync_index():
+    """
+    Incrementally re-index the document folder, apply the same changes to
+    the BM25 index and invalidate cached answers for the corpus if
+    anything changed.
+    """
+    require_ready()
+    loop = asyncio.get_running_loop()
+    async with sync_lock:
+        report = await loop.run_in_executor(
+            search_executor,
+            lambda: sync_vectorstore(vectorstore, lexical_index=get_lexical_index(vectorstore))
+        )
+    if report["chunks_added"] or report["chunks_deleted"]:
+        report["answers_invalidated"] = semantic_cache.invalidate(CORPUS_NAME)
+    return report
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Prometheus metrics: per-stage latency, LLM tokens, cache hits and
+    in-flight requests.
+    """
+    return metrics_response()
+
+@app.get("/health/live")
+async def liveness():
+    """
+    Liveness probe: the process is up and serving HTTP.
+    """
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness():
+    """
+    Readiness probe: models and index are loaded and warmed up.
+    Also reports the cold-start time of each component.
+    """
+    return JSONResponse(
+        status_code=200 if startup["ready"] else 503,
+        content={
+            "ready": startup["ready"],
+            "error": startup["error"],
+            "startup_seconds": startup["seconds"]
+        }
+    )
+
 @app.get("/")
 async def root():
     """
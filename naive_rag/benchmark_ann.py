@@ -0,0 +1,78 @@
+import argparse
+import time
+
+import numpy as np
+
+from ann_index import IVFIndex, default_nlist
+
+def make_corpus(n: int, dim: int, n_topics: int, noise: float, rng) -> np.ndarray:
+    """Clustered unit vectors, loosely shaped like sentence embeddings of a topical corpus"""
+    topics = rng.standard_normal((n_topics, dim)).astype(np.float32)
+    vectors = np.empty((n, dim), dtype=np.float32)
+    for start in range(0, n, 100000):
+        end = min(n, start + 100000)
+        block = topics[rng.integers(0, n_topics, end - start)]
+        block += noise * rng.standard_normal(block.shape).astype(np.float32)
+        vectors[start:end] = block / np.linalg.norm(block, axis=1, keepdims=True)
+    return vectors
+
+def exact_top_k(vectors: np.ndarray, query: np.ndarray, k: int) -> np.ndarray:
+    scores = vectors @ query
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+def timed_queries(fn, queries):
+    """Run fn per query, returning results and per-query latencies"""
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(fn(query))
+        latencies.append(time.perf_counter() - start)
+    return results, np.array(latencies)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall and latency of the IVF index against exact search")
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="Comma separated corpus sizes")
+    parser.add_argument("--dim", type=int, default=384, help="all-MiniLM-L6-v2 embedding size")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=0, help="0 picks about 4 * sqrt(n)")
+    parser.add_argument("--nprobes", default="1,4,8,16,32,64")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for n in [int(size) for size in args.sizes.split(",")]:
+        rng = np.random.default_rng(args.seed)
+        vectors = make_corpus(n, args.dim, n_topics=max(10, n // 500), noise=0.6, rng=rng)
+
+        # Queries are perturbed corpus rows, so they have real neighbours
+        picks = vectors[rng.integers(0, n, args.queries)]
+        queries = picks + 0.3 * rng.standard_normal(picks.shape).astype(np.float32) / np.sqrt(args.dim)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+        truth, exact_latencies = timed_queries(lambda q: exact_top_k(vectors, q, args.k), queries)
+
+        start = time.perf_counter()
+        index = IVFIndex(nlist=args.nlist or default_nlist(n)).build(vectors)
+        build_s = time.perf_counter() - start
+
+        print(f"\nn={n:,}  dim={args.dim}  nlist={index.nlist}  build={build_s:.1f}s  k={args.k}")
+        print(f"{'mode':<14} {'recall@k':>9} {'p50(ms)':>9} {'p95(ms)':>9} {'speedup':>8}")
+        exact_p50 = np.percentile(exact_latencies, 50)
+        print(f"{'exact':<14} {1.0:>9.3f} {exact_p50 * 1000:>9.2f} {np.percentile(exact_latencies, 95) * 1000:>9.2f} {1.0:>7.1f}x")
+
+        for nprobe in [int(p) for p in args.nprobes.split(",")]:
+            if nprobe > index.nlist:
+                continue
+            results, latencies = timed_queries(
+                lambda q: index.search(vectors, q, args.k, nprobe=nprobe)[0], queries
+            )
+            recall = np.mean([
+                len(set(result.tolist()) & set(expected.tolist())) / args.k
+                for result, expected in zip(results, truth)
+            ])
+            p50 = np.percentile(latencies, 50)
+            print(
+                f"{f'ivf nprobe={nprobe}':<14} {recall:>9.3f} {p50 * 1000:>9.2f} "
+                f"{np.percentile(latencies, 95) * 1000:>9.2f} {exact_p50 / p50:>7.1f}x"
+            )
@@ -0,0 +1,71 @@
+import argparse
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+import numpy_store
+from benchmark_ann import make_corpus
+from numpy_store import NumpyVectorStore
+
+def check_batch(store, queries, k: int) -> int:
+    """Number of queries whose batched top-k differs from the single-query search"""
+    batched = store.similarity_search_by_vectors(queries, k=k)
+    mismatches = 0
+    for query, docs in zip(queries, batched):
+        single = store.similarity_search_by_vector(query, k=k)
+        if [d.page_content for d in docs] != [d.page_content for d in single]:
+            mismatches += 1
+    return mismatches
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check batched search against single queries and time both")
+    parser.add_argument("--sizes", default="20000,200000", help="Comma separated corpus sizes")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=256, help="Questions per batch")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--dtypes", default="float32,float16,int8")
+    parser.add_argument("--indexes", default="exact,ivf")
+    parser.add_argument("--block-rows", type=int, default=numpy_store.SCAN_BLOCK_ROWS,
+                        help="Scan block size; small values exercise merging across blocks")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    numpy_store.SCAN_BLOCK_ROWS = args.block_rows
+
+    failed = False
+    for n in [int(size) for size in args.sizes.split(",")]:
+        rng = np.random.default_rng(args.seed)
+        vectors = make_corpus(n, args.dim, n_topics=max(10, n // 500), noise=0.6, rng=rng)
+        picks = vectors[rng.integers(0, n, args.queries)]
+        queries = picks + 0.3 * rng.standard_normal(picks.shape).astype(np.float32) / np.sqrt(args.dim)
+        queries = queries.tolist()
+
+        print(f"\nn={n:,}  dim={args.dim}  queries={args.queries}  k={args.k}  block={args.block_rows}")
+        print(f"{'store':<14} {'mismatch':>9} {'single(s)':>10} {'batch(s)':>9} {'speedup':>8}")
+        for index in args.indexes.split(","):
+            for dtype in args.dtypes.split(","):
+                workdir = tempfile.mkdtemp(prefix="batch_search_")
+                try:
+                    store = NumpyVectorStore(workdir, None, dtype=dtype, index=index, ivf_min_rows=0)
+                    ids = [str(i) for i in range(n)]
+                    store.upsert_embeddings(ids, vectors, ids)
+
+                    mismatches = check_batch(store, queries, args.k)
+                    failed = failed or mismatches > 0
+                    single_s = timed(lambda: [store.similarity_search_by_vector(q, k=args.k) for q in queries])
+                    batch_s = timed(lambda: store.similarity_search_by_vectors(queries, k=args.k))
+                    print(
+                        f"{f'{index} {dtype}':<14} {mismatches:>9} {single_s:>10.3f} "
+                        f"{batch_s:>9.3f} {single_s / batch_s:>7.1f}x"
+                    )
+                finally:
+                    shutil.rmtree(workdir, ignore_errors=True)
+
+    if failed:
+        raise SystemExit("Batched search differs from single-query search")
@@ -0,0 +1,47 @@
+import argparse
+import time
+
+import numpy as np
+
+from context_builder import build_context, count_tokens
+from db import create_vectorstore
+from search import search_documents
+
+QUERIES = [
+    "What is multi-head attention?",
+    "How are positional encodings computed?",
+    "What BLEU score did the transformer reach?",
+    "How does StructRAG choose a structure type?",
+    "Why is self-attention faster than recurrence?",
+]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prompt context tokens before and after context packing")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--budget", type=int, default=None, help="Defaults to CONTEXT_TOKEN_BUDGET")
+    args = parser.parse_args()
+
+    vectorstore = create_vectorstore()
+
+    print(f"{'query':<48} {'raw':>7} {'packed':>7} {'saved':>7} {'build(ms)':>10}")
+    raw_total, packed_total, build_times = 0, 0, []
+    for query in QUERIES:
+        context = search_documents(vectorstore, query, k=args.k)
+
+        # Previous prompt format: the Python list repr of the chunks
+        raw = count_tokens(f"{context}")
+
+        start = time.perf_counter()
+        packed_context = build_context(context, budget=args.budget)
+        build_times.append(time.perf_counter() - start)
+        packed = count_tokens(packed_context)
+
+        raw_total += raw
+        packed_total += packed
+        print(f"{query[:48]:<48} {raw:>7} {packed:>7} {1 - packed / max(raw, 1):>7.1%} {build_times[-1] * 1000:>10.2f}")
+
+    print(
+        f"\nTotal context tokens: {raw_total} -> {packed_total} "
+        f"({1 - packed_total / max(raw_total, 1):.1%} fewer), "
+        f"build p50 {np.percentile(build_times, 50) * 1000:.2f}ms"
+    )
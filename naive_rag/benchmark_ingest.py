@@ -0,0 +1,70 @@
+import argparse
+import shutil
+import tempfile
+import time
+
+from langchain.vectorstores import Chroma
+
+from db import (
+    DOCUMENTS_DIR,
+    chunk_ids,
+    embed_in_batches,
+    initialize_embeddings,
+    list_pdfs,
+    load_and_split,
+    load_and_split_parallel,
+    write_chunks,
+)
+
+def count_pages(chunks) -> int:
+    """Number of distinct pages with text among the chunks"""
+    return len({(c.metadata.get("source"), c.metadata.get("page")) for c in chunks})
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark index build stages over the document folder")
+    parser.add_argument("--documents-dir", default=DOCUMENTS_DIR)
+    parser.add_argument("--workers", default="1,2,4", help="Comma separated process pool sizes for parsing")
+    parser.add_argument("--batch-sizes", default="16,64,256", help="Comma separated embedding batch sizes")
+    args = parser.parse_args()
+
+    pdfs = list_pdfs(args.documents_dir)
+    names = list(pdfs)
+    paths = [pdfs[name] for name in names]
+    print(f"Corpus: {len(paths)} PDFs in {args.documents_dir}")
+
+    # Parsing and splitting
+    print(f"\n{'parse':<22} {'seconds':>8} {'pages/s':>9} {'chunks/s':>9}")
+    parsed, elapsed = timed(lambda: [load_and_split(path) for path in paths])
+    chunks = [c for file_chunks in parsed for c in file_chunks]
+    pages = count_pages(chunks)
+    print(f"{'sequential':<22} {elapsed:>8.2f} {pages / elapsed:>9.1f} {len(chunks) / elapsed:>9.1f}")
+    for workers in [int(w) for w in args.workers.split(",")]:
+        _, elapsed = timed(load_and_split_parallel, paths, workers)
+        print(f"{f'process pool ({workers})':<22} {elapsed:>8.2f} {pages / elapsed:>9.1f} {len(chunks) / elapsed:>9.1f}")
+
+    # Embedding
+    texts = [c.page_content for c in chunks]
+    embeddings = initialize_embeddings()
+    embeddings.embed_query("warm up")
+    print(f"\n{'embed':<22} {'seconds':>8} {'chunks/s':>9}")
+    vectors = None
+    for batch_size in [int(b) for b in args.batch_sizes.split(",")]:
+        vectors, elapsed = timed(embed_in_batches, embeddings, texts, batch_size)
+        print(f"{f'batch size {batch_size}':<22} {elapsed:>8.2f} {len(texts) / elapsed:>9.1f}")
+
+    # Bulk write into a throwaway Chroma directory
+    ids = [i for name, file_chunks in zip(names, parsed) for i in chunk_ids(name, file_chunks)]
+    persist_directory = tempfile.mkdtemp(prefix="ingest_bench_")
+    try:
+        vectorstore = Chroma(persist_directory=persist_directory, embedding_function=embeddings)
+        _, elapsed = timed(write_chunks, vectorstore, ids, chunks, vectors)
+        print(f"\n{'bulk write':<22} {elapsed:>8.2f} {len(ids) / elapsed:>9.1f} chunks/s")
+    finally:
+        shutil.rmtree(persist_directory, ignore_errors=True)
+
+    print(f"\n{pages} pages, {len(chunks)} chunks")
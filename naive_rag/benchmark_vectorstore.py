@@ -0,0 +1,91 @@
+import argparse
+import shutil
+import tempfile
+import time
+
+import numpy as np
+from langchain.vectorstores import Chroma
+
+from db import (
+    DOCUMENTS_DIR,
+    chunk_ids,
+    embed_in_batches,
+    initialize_embeddings,
+    list_pdfs,
+    load_and_split_parallel,
+    write_chunks,
+)
+from numpy_store import NumpyVectorStore
+
+QUERIES = [
+    "What is multi-head attention?",
+    "How are positional encodings computed?",
+    "What BLEU score did the transformer reach?",
+    "How does StructRAG choose a structure type?",
+    "Why is self-attention faster than recurrence?",
+]
+
+def percentiles(latencies):
+    return np.percentile(latencies, 50) * 1000, np.percentile(latencies, 95) * 1000
+
+def bench_queries(store, query_vectors, k: int, repeats: int):
+    """Latencies of search by precomputed vector, so embedding cost is excluded"""
+    latencies, results = [], []
+    for _ in range(repeats):
+        for vector in query_vectors:
+            start = time.perf_counter()
+            docs = store.similarity_search_by_vector(vector, k=k)
+            latencies.append(time.perf_counter() - start)
+            results.append([d.page_content for d in docs])
+    return latencies, results[:len(query_vectors)]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare Chroma and the memory-mapped NumPy vector store")
+    parser.add_argument("--documents-dir", default=DOCUMENTS_DIR)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--dtypes", default="float32,float16,int8")
+    args = parser.parse_args()
+
+    pdfs = list_pdfs(args.documents_dir)
+    names = list(pdfs)
+    parsed = load_and_split_parallel([pdfs[name] for name in names])
+    chunks = [c for file_chunks in parsed for c in file_chunks]
+    ids = [i for name, file_chunks in zip(names, parsed) for i in chunk_ids(name, file_chunks)]
+
+    embeddings = initialize_embeddings()
+    vectors = embed_in_batches(embeddings, [c.page_content for c in chunks])
+    query_vectors = embeddings.embed_documents(QUERIES)
+    print(f"{len(chunks)} chunks, {len(QUERIES)} queries x {args.repeats} repeats, k={args.k}")
+
+    workdir = tempfile.mkdtemp(prefix="vectorstore_bench_")
+    try:
+        stores = {}
+        chroma_dir = f"{workdir}/chroma"
+        write_chunks(Chroma(persist_directory=chroma_dir, embedding_function=embeddings), ids, chunks, vectors)
+        stores["chroma"] = (Chroma, {"persist_directory": chroma_dir, "embedding_function": embeddings})
+
+        for dtype in args.dtypes.split(","):
+            numpy_dir = f"{workdir}/numpy-{dtype}"
+            write_chunks(NumpyVectorStore(numpy_dir, embeddings, dtype=dtype), ids, chunks, vectors)
+            stores[f"numpy {dtype}"] = (NumpyVectorStore, {
+                "persist_directory": numpy_dir, "embedding_function": embeddings, "dtype": dtype
+            })
+
+        print(f"\n{'store':<16} {'open(ms)':>9} {'p50(ms)':>9} {'p95(ms)':>9} {'agree@k':>8}")
+        reference = None
+        for name, (cls, kwargs) in stores.items():
+            start = time.perf_counter()
+            store = cls(**kwargs)
+            open_ms = (time.perf_counter() - start) * 1000
+
+            latencies, results = bench_queries(store, query_vectors, args.k, args.repeats)
+            if reference is None:
+                reference = results
+            agreement = np.mean([
+                len(set(r) & set(ref)) / max(len(ref), 1) for r, ref in zip(results, reference)
+            ])
+            p50, p95 = percentiles(latencies)
+            print(f"{name:<16} {open_ms:>9.1f} {p50:>9.3f} {p95:>9.3f} {agreement:>8.3f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
@@ -0,0 +1,129 @@
+import os
+import re
+from functools import lru_cache
+from typing import List, Optional, Set
+
+import tiktoken
+
+# Prompt budget for retrieved context, in tokens of CONTEXT_MODEL's encoding
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+CONTEXT_MODEL = os.getenv("CONTEXT_MODEL", "gpt-4")
+
+# Overlap between consecutive chunks is at most the splitter's chunk_overlap (200)
+MAX_OVERLAP_CHARS = 200
+MIN_OVERLAP_CHARS = 30
+
+# Passages sharing this fraction of their word shingles are near-duplicates
+DUPLICATE_THRESHOLD = 0.8
+SHINGLE_SIZE = 5
+
+# Don't bother truncating a passage into less room than this
+MIN_TRUNCATED_TOKENS = 64
+
+@lru_cache(maxsize=None)
+def get_encoder(model: str = CONTEXT_MODEL) -> tiktoken.Encoding:
+    """Load the tokenizer for a model once"""
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+@lru_cache(maxsize=8192)
+def count_tokens(text: str, model: str = CONTEXT_MODEL) -> int:
+    """Token count of a text, cached since the same chunks come back across queries"""
+    return len(get_encoder(model).encode(text))
+
+def overlap_length(left: str, right: str, max_chars: int = MAX_OVERLAP_CHARS, min_chars: int = MIN_OVERLAP_CHARS) -> int:
+    """Length of the longest suffix of left that is also a prefix of right"""
+    tail = left[-max_chars:]
+    probe = right[:min_chars]
+    if len(probe) < min_chars:
+        return 0
+    start = tail.find(probe)
+    while start != -1:
+        if right.startswith(tail[start:]):
+            return len(tail) - start
+        start = tail.find(probe, start + 1)
+    return 0
+
+def merge_overlapping(chunks: List[str]) -> List[str]:
+    """
+    Stitch chunks that continue one another (the splitter's chunk_overlap)
+    into a single passage, keeping the rank of the best-ranked member.
+    """
+    passages = list(chunks)
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(passages)):
+            for j in range(len(passages)):
+                if i == j:
+                    continue
+                overlap = overlap_length(passages[i], passages[j])
+                if overlap:
+                    joined = passages[i] + passages[j][overlap:]
+                    keep, drop = min(i, j), max(i, j)
+                    passages[keep] = joined
+                    del passages[drop]
+                    merged = True
+                    break
+            if merged:
+                break
+    return passages
+
+def _shingles(text: str) -> Set[int]:
+    words = re.findall(r"\w+", text.lower())
+    if len(words) <= SHINGLE_SIZE:
+        return {hash(tuple(words))}
+    return {hash(tuple(words[i:i + SHINGLE_SIZE])) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+def drop_near_duplicates(passages: List[str], threshold: float = DUPLICATE_THRESHOLD) -> List[str]:
+    """
+    Keep the first of any passages that are contained in, or mostly share
+    word shingles with, a higher-ranked passage.
+    """
+    kept, kept_shingles = [], []
+    for passage in passages:
+        shingles = _shingles(passage)
+        duplicate = False
+        for other, other_shingles in zip(kept, kept_shingles):
+            if passage in other:
+                duplicate = True
+                break
+            smaller = min(len(shingles), len(other_shingles)) or 1
+            if len(shingles & other_shingles) / smaller >= threshold:
+                duplicate = True
+                break
+        if not duplicate:
+            kept.append(passage)
+            kept_shingles.append(shingles)
+    return kept
+
+def pack_to_budget(passages: List[str], budget: int = CONTEXT_TOKEN_BUDGET, model: str = CONTEXT_MODEL) -> List[str]:
+    """
+    Take passages in rank order until the token budget is spent; the first
+    passage that no longer fits is truncated if enough room is left.
+    """
+    packed, used = [], 0
+    for passage in passages:
+        tokens = count_tokens(passage, model)
+        if used + tokens <= budget:
+            packed.append(passage)
+            used += tokens
+            continue
+        remaining = budget - used
+        if remaining >= MIN_TRUNCATED_TOKENS:
+            encoder = get_encoder(model)
+            packed.append(encoder.decode(encoder.encode(passage)[:remaining]))
+        break
+    return packed
+
+def build_context(chunks: List[str], budget: Optional[int] = None, model: str = CONTEXT_MODEL) -> str:
+    """
+    Turn ranked retrieved chunks into the prompt's context block: merge
+    overlapping chunks, drop near-duplicates, pack to the token budget and
+    number the passages.
+    """
+    passages = drop_near_duplicates(merge_overlapping([c.strip() for c in chunks if c.strip()]))
+    passages = pack_to_budget(passages, CONTEXT_TOKEN_BUDGET if budget is None else budget, model)
+    return "\n\n".join(f"[{i}] {passage}" for i, passage in enumerate(passages, start=1))
@@ -0,0 +1,350 @@
+import os
+import time
+import random
+import asyncio
+import threading
+from typing import Optional, Tuple
+
+import httpx
+from dotenv import load_dotenv
+from openai import (
+    APIConnectionError,
+    APITimeoutError,
+    AsyncOpenAI,
+    InternalServerError,
+    OpenAI,
+    RateLimitError,
+)
+
+from metrics import observe_stage
+
+load_dotenv()
+
+# Per-attempt timeouts and the overall deadline across retries, in seconds
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_DEADLINE = float(os.getenv("LLM_DEADLINE", "120"))
+
+# Retry policy: full-jitter exponential backoff
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "20"))
+
+# HTTP connection pool shared by all calls of a client
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "20"))
+
+# Account limits; 0 disables the corresponding bucket
+LLM_RPM = float(os.getenv("LLM_RPM", "0"))
+LLM_TPM = float(os.getenv("LLM_TPM", "0"))
+
+# Completion size assumed for rate limiting when max_tokens is not set
+DEFAULT_COMPLETION_TOKENS = 512
+
+RETRYABLE_ERRORS = (RateLimitError, APITimeoutError, APIConnectionError, InternalServerError)
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at capacity per minute.
+
+    reserve() always succeeds: it takes the tokens, letting the balance go
+    negative, and returns how many it took and how long the caller must
+    wait for the balance it consumed to be refilled. Callers therefore
+    queue in arrival order instead of failing.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> Tuple[float, float]:
+        """
+        Take amount tokens, capped at the capacity so one large request can
+        still run, and return the tokens taken and the seconds to wait
+        before using them
+        """
+        amount = min(amount, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            return amount, max(0.0, -self.tokens / self.rate)
+
+    def refund(self, amount: float):
+        """Give back tokens that were reserved but not used"""
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute buckets checked together"""
+
+    def __init__(self, rpm: float = LLM_RPM, tpm: float = LLM_TPM):
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+
+    def reserve(self, tokens: int) -> Tuple[int, float]:
+        """Reserve one request; returns the tokens actually taken and the seconds to wait"""
+        wait = 0.0
+        if self.requests is not None:
+            wait = max(wait, self.requests.reserve(1)[1])
+        if self.tokens is not None:
+            taken, token_wait = self.tokens.reserve(tokens)
+            tokens, wait = int(taken), max(wait, token_wait)
+        return tokens, wait
+
+    def settle(self, reserved: int, used: Optional[int]):
+        """Refund the difference once the real token usage is known"""
+        if self.tokens is not None and used is not None and used < reserved:
+            self.tokens.refund(reserved - used)
+
+    def release(self, reserved: int):
+        """Give back the whole reservation of an attempt that failed"""
+        if self.requests is not None:
+            self.requests.refund(1)
+        self.settle(reserved, 0)
+
+# One limiter per process, shared by the sync and async clients
+rate_limiter = RateLimiter()
+
+def _completion_budget(kwargs: dict) -> int:
+    return kwargs.get("max_tokens") or DEFAULT_COMPLETION_TOKENS
+
+def estimate_tokens(kwargs: dict) -> int:
+    """Rough prompt (4 characters per token) plus completion size of a request"""
+    chars = 0
+    for message in kwargs.get("messages", []):
+        content = message.get("content", "")
+        if isinstance(content, str):
+            chars += len(content)
+        else:
+            for part in content:
+                # Images are billed per tile; count a low-detail image
+                chars += len(part.get("text", "")) if part.get("type") == "text" else 4 * 85
+    return chars // 4 + _completion_budget(kwargs)
+
+def backoff_delay(attempt: int, error: Exception) -> float:
+    """Server-provided Retry-After if any, else full-jitter exponential backoff"""
+    response = getattr(error, "response", None)
+    if response is not None:
+        retry_after = response.headers.get("retry-after")
+        if retry_after:
+            try:
+                return min(float(retry_after), LLM_BACKOFF_MAX)
+            except ValueError:
+                pass
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT)
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_KEEPALIVE)
+
+def _api_key(api_key: Optional[str]) -> str:
+    api_key = api_key or os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise ValueError("OPENAI_API_KEY not found in .env file")
+    return api_key
+
+def _usage_tokens(response) -> Optional[int]:
+    usage = getattr(response, "usage", None)
+    return usage.total_tokens if usage is not None else None
+
+class SettledStream:
+    """
+    Streamed completion that settles its rate-limit reservation once the
+    usage chunk arrives (stream_options={"include_usage": True}), or when
+    it ends or is closed, counting one token per streamed delta.
+    """
+
+    def __init__(self, stream, limiter: RateLimiter, reserved: int, completion_budget: int):
+        self._stream = stream
+        self._limiter = limiter
+        self._reserved = reserved
+        self._completion_budget = completion_budget
+        self._generated = 0
+        self._settled = False
+
+    def settle(self, used: Optional[int] = None):
+        if self._settled:
+            return
+        self._settled = True
+        if used is None:
+            used = self._reserved - self._completion_budget + self._generated
+        self._limiter.settle(self._reserved, used)
+
+    def _observe(self, chunk):
+        usage = getattr(chunk, "usage", None)
+        if usage is not None:
+            self.settle(usage.total_tokens)
+        elif chunk.choices and chunk.choices[0].delta.content:
+            self._generated += 1
+        return chunk
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return self._observe(next(self._stream))
+        except StopIteration:
+            self.settle()
+            raise
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return self._observe(await self._stream.__anext__())
+        except StopAsyncIteration:
+            self.settle()
+            raise
+
+    def close(self):
+        self.settle()
+        return self._stream.close()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+    def __del__(self):
+        # A stream abandoned mid-way still gives back its unused budget
+        if "_settled" in self.__dict__:
+            self.settle()
+
+def _reserve_attempt(limiter: RateLimiter, tokens: int, deadline: float) -> Tuple[int, float]:
+    """
+    Reserve the rate limits for one attempt. Fails fast, giving the
+    reservation back, when the wait alone would run past the deadline.
+    """
+    reserved, wait = limiter.reserve(tokens)
+    if time.monotonic() + wait > deadline:
+        limiter.release(reserved)
+        raise TimeoutError(f"Rate limit wait of {wait:.1f}s exceeds the LLM_DEADLINE of {LLM_DEADLINE:.1f}s")
+    return reserved, wait
+
+class LLMClient:
+    """
+    Blocking OpenAI chat client with a pooled HTTP connection, per-call
+    timeouts, retries with jittered exponential backoff and RPM/TPM rate
+    limiting. With stream=True only opening the stream is retried.
+    """
+
+    def __init__(self, api_key: Optional[str] = None, limiter: RateLimiter = rate_limiter):
+        # The SDK's own retries are disabled so the policy lives in one place
+        self.client = OpenAI(
+            api_key=_api_key(api_key),
+            max_retries=0,
+            timeout=_timeout(),
+            http_client=httpx.Client(limits=_limits(), timeout=_timeout())
+        )
+        self.limiter = limiter
+
+    def chat_completion(self, **kwargs):
+        """chat.completions.create with rate limiting and retries"""
+        # The deadline covers the rate-limit waits as well as the attempts
+        deadline = time.monotonic() + LLM_DEADLINE
+        tokens = estimate_tokens(kwargs)
+
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            # Every attempt is a request against the account limits
+            reserved, wait = _reserve_attempt(self.limiter, tokens, deadline)
+            if wait > 0:
+                observe_stage("llm_rate_limit_wait", wait)
+                time.sleep(wait)
+            try:
+                # Each attempt only gets the time left before the deadline
+                timeout = max(0.1, min(LLM_TIMEOUT, deadline - time.monotonic()))
+                response = self.client.chat.completions.create(timeout=timeout, **kwargs)
+            except BaseException as e:
+                # A failed attempt gives its reservation back
+                self.limiter.release(reserved)
+                if not isinstance(e, RETRYABLE_ERRORS):
+                    raise
+                delay = backoff_delay(attempt, e)
+                if attempt == LLM_MAX_RETRIES or time.monotonic() + delay > deadline:
+                    raise
+                print(f"Retrying LLM call in {delay:.2f}s after {type(e).__name__}: {str(e)}")
+                time.sleep(delay)
+                continue
+            if kwargs.get("stream"):
+                return SettledStream(response, self.limiter, reserved, _completion_budget(kwargs))
+            self.limiter.settle(reserved, _usage_tokens(response))
+            return response
+
+class AsyncLLMClient:
+    """
+    Async counterpart of LLMClient; waits for rate limits and backoff
+    without blocking the event loop.
+    """
+
+    def __init__(self, api_key: Optional[str] = None, limiter: RateLimiter = rate_limiter):
+        self.client = AsyncOpenAI(
+            api_key=_api_key(api_key),
+            max_retries=0,
+            timeout=_timeout(),
+            http_client=httpx.AsyncClient(limits=_limits(), timeout=_timeout())
+        )
+        self.limiter = limiter
+
+    async def chat_completion(self, **kwargs):
+        """chat.completions.create with rate limiting and retries"""
+        # The deadline covers the rate-limit waits as well as the attempts
+        deadline = time.monotonic() + LLM_DEADLINE
+        tokens = estimate_tokens(kwargs)
+
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            # Every attempt is a request against the account limits
+            reserved, wait = _reserve_attempt(self.limiter, tokens, deadline)
+            if wait > 0:
+                observe_stage("llm_rate_limit_wait", wait)
+                await asyncio.sleep(wait)
+            try:
+                # Each attempt only gets the time left before the deadline
+                timeout = max(0.1, min(LLM_TIMEOUT, deadline - time.monotonic()))
+                response = await self.client.chat.completions.create(timeout=timeout, **kwargs)
+            except BaseException as e:
+                # A failed attempt gives its reservation back
+                self.limiter.release(reserved)
+                if not isinstance(e, RETRYABLE_ERRORS):
+                    raise
+                delay = backoff_delay(attempt, e)
+                if attempt == LLM_MAX_RETRIES or time.monotonic() + delay > deadline:
+                    raise
+                print(f"Retrying LLM call in {delay:.2f}s after {type(e).__name__}: {str(e)}")
+                await asyncio.sleep(delay)
+                continue
+            if kwargs.get("stream"):
+                return SettledStream(response, self.limiter, reserved, _completion_budget(kwargs))
+            self.limiter.settle(reserved, _usage_tokens(response))
+            return response
+
+    async def aclose(self):
+        """Close the connection pool, e.g. before its event loop is closed"""
+        await self.client.close()
+
+# Process-wide clients, created on first use
+_sync_client: Optional[LLMClient] = None
+_async_client: Optional[AsyncLLMClient] = None
+_clients_lock = threading.Lock()
+
+def get_llm_client() -> LLMClient:
+    """Shared blocking client"""
+    global _sync_client
+    with _clients_lock:
+        if _sync_client is None:
+            _sync_client = LLMClient()
+    return _sync_client
+
+def get_async_llm_client() -> AsyncLLMClient:
+    """Shared async client"""
+    global _async_client
+    with _clients_lock:
+        if _async_client is None:
+            _async_client = AsyncLLMClient()
+    return _async_client
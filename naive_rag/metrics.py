@@ -0,0 +1,117 @@
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from starlette.responses import Response
+
+# 1ms to 60s, wide enough for both a vector search and a slow LLM call
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0,
+)
+
+STAGE_LATENCY = Histogram(
+    "rag_stage_latency_seconds",
+    "Latency of each pipeline stage",
+    ["stage"],
+    buckets=LATENCY_BUCKETS
+)
+REQUEST_LATENCY = Histogram(
+    "rag_request_latency_seconds",
+    "End-to-end latency of HTTP requests, including streamed bodies",
+    ["method", "path", "status"],
+    buckets=LATENCY_BUCKETS
+)
+IN_FLIGHT = Gauge(
+    "rag_requests_in_flight",
+    "HTTP requests currently being processed",
+    ["path"]
+)
+LLM_TOKENS = Counter(
+    "rag_llm_tokens_total",
+    "Tokens sent to and generated by the LLM",
+    ["model", "kind"]
+)
+CACHE_LOOKUPS = Counter(
+    "rag_cache_lookups_total",
+    "Cache lookups by cache and result",
+    ["cache", "result"]
+)
+
+# Label children are resolved once per stage instead of on every observation
+_stage_histograms: Dict[str, Histogram] = {}
+
+def stage_histogram(stage: str) -> Histogram:
+    histogram = _stage_histograms.get(stage)
+    if histogram is None:
+        histogram = _stage_histograms[stage] = STAGE_LATENCY.labels(stage)
+    return histogram
+
+@contextmanager
+def track_stage(stage: str):
+    """Time a block of work as one pipeline stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage_histogram(stage).observe(time.perf_counter() - start)
+
+def observe_stage(stage: str, seconds: float):
+    """Record a stage duration measured by the caller"""
+    stage_histogram(stage).observe(seconds)
+
+def record_llm_usage(model: str, usage) -> None:
+    """Count prompt and completion tokens from an OpenAI usage object"""
+    if usage is None:
+        return
+    LLM_TOKENS.labels(model, "prompt").inc(usage.prompt_tokens or 0)
+    LLM_TOKENS.labels(model, "completion").inc(usage.completion_tokens or 0)
+
+def record_cache(cache: str, hits: int = 0, misses: int = 0) -> None:
+    """Count cache hits and misses"""
+    if hits:
+        CACHE_LOOKUPS.labels(cache, "hit").inc(hits)
+    if misses:
+        CACHE_LOOKUPS.labels(cache, "miss").inc(misses)
+
+def metrics_response() -> Response:
+    """Current metrics in the Prometheus text format"""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+class MetricsMiddleware:
+    """
+    ASGI middleware that tracks in-flight requests and request latency.
+    It wraps the whole response, so streamed answers are timed until their
+    last event. Unknown paths share one label to keep cardinality bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.paths: Optional[set] = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] == "/metrics":
+            await self.app(scope, receive, send)
+            return
+
+        if self.paths is None:
+            self.paths = {getattr(route, "path", None) for route in scope["app"].routes}
+        path = scope["path"] if scope["path"] in self.paths else "other"
+        status = {"code": 500}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        in_flight = IN_FLIGHT.labels(path)
+        in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            in_flight.dec()
+            REQUEST_LATENCY.labels(scope["method"], path, str(status["code"])).observe(
+                time.perf_counter() - start
+            )
@@ -0,0 +1,94 @@
+import os
+from typing import List
+
+import numpy as np
+from langchain.embeddings.base import Embeddings
+
+# Where exported and quantized models are cached between runs
+ONNX_CACHE_DIR = os.getenv("ONNX_CACHE_DIR", "./onnx_models")
+QUANTIZED_FILE_NAME = "model_quantized.onnx"
+
+def export_quantized_model(model_name: str, task: str) -> str:
+    """
+    Export a Hugging Face model to ONNX and apply int8 dynamic quantization.
+
+    Args:
+        model_name: Hugging Face model id
+        task: "feature-extraction" for embedders, "text-classification" for cross-encoders
+
+    Returns:
+        Directory holding the quantized model and its tokenizer
+    """
+    # Imported lazily so the PyTorch path does not need optimum installed
+    from optimum.onnxruntime import (
+        ORTModelForFeatureExtraction,
+        ORTModelForSequenceClassification,
+        ORTQuantizer,
+    )
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    from transformers import AutoTokenizer
+
+    export_dir = os.path.join(ONNX_CACHE_DIR, model_name.replace("/", "__"))
+    quantized_dir = f"{export_dir}-int8"
+    if os.path.exists(os.path.join(quantized_dir, QUANTIZED_FILE_NAME)):
+        return quantized_dir
+
+    model_cls = ORTModelForFeatureExtraction if task == "feature-extraction" else ORTModelForSequenceClassification
+    model = model_cls.from_pretrained(model_name, export=True)
+    model.save_pretrained(export_dir)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    tokenizer.save_pretrained(export_dir)
+
+    # Dynamic quantization: int8 weights, activations quantized on the fly
+    quantizer = ORTQuantizer.from_pretrained(export_dir)
+    quantization_config = AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+    quantizer.quantize(save_dir=quantized_dir, quantization_config=quantization_config)
+    tokenizer.save_pretrained(quantized_dir)
+
+    return quantized_dir
+
+class ONNXEmbeddings(Embeddings):
+    """
+    Int8 ONNX Runtime drop-in for HuggingFaceEmbeddings with sentence-transformers
+    models: mean pooling over the attention mask followed by L2 normalization.
+    """
+
+    def __init__(
+        self,
+        model_name: str = "sentence-transformers/all-MiniLM-L6-v2",
+        batch_size: int = 64,
+        max_length: int = 256
+    ):
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+        from transformers import AutoTokenizer
+
+        model_dir = export_quantized_model(model_name, "feature-extraction")
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.model = ORTModelForFeatureExtraction.from_pretrained(model_dir, file_name=QUANTIZED_FILE_NAME)
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        inputs = self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=self.max_length,
+            return_tensors="np"
+        )
+        token_embeddings = np.asarray(self.model(**inputs).last_hidden_state)
+        mask = inputs["attention_mask"][..., None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts in batches"""
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            vectors.extend(self._embed(texts[start:start + self.batch_size]).tolist())
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a single query"""
+        return self._embed([text])[0].tolist()
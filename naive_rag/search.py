@@ -1,55 +1,226 @@
-from typing import List
+from typing import List, AsyncIterator, Optional
 import os
-from openai import OpenAI
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
+from bm25 import BM25Index, reciprocal_rank_fusion
+from context_builder import build_context
+from db import chroma_collection
+from llm_client import AsyncLLMClient, get_async_llm_client
+from metrics import observe_stage, record_llm_usage, track_stage
+from numpy_store import NumpyVectorStore
+
 # Load environment variables
 load_dotenv()
 
-# Initialize OpenAI client
-OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
-if not OPENAI_API_KEY:
-    raise ValueError("OPENAI_API_KEY not found in .env file")
-client = OpenAI(api_key=OPENAI_API_KEY)
+def get_client() -> AsyncLLMClient:
+    """Shared LLM client with pooling, retries and rate limiting"""
+    return get_async_llm_client()
+
+LLM_MODEL = "gpt-4"
+
+# Returned instead of an answer when the LLM call fails
+ANSWER_ERROR_MESSAGE = "Sorry, I encountered an error while generating the answer."
+
+# Bounded pool for CPU-bound retrieval work so it never blocks the event loop
+SEARCH_MAX_WORKERS = int(os.getenv("SEARCH_MAX_WORKERS", "4"))
+search_executor = ThreadPoolExecutor(
+    max_workers=SEARCH_MAX_WORKERS,
+    thread_name_prefix="search"
+)
+
+# BM25 index over the vector store's chunks, built by get_lexical_index
+lexical_index: Optional[BM25Index] = None
+_lexical_index_lock = threading.Lock()
+
+# Candidates fetched from each retriever before fusion, as a multiple of k
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "4"))
+RRF_K = int(os.getenv("RRF_K", "60"))
 
-def search_documents(vectorstore, query: str, k: int = 5) -> List[str]:
+def get_lexical_index(vectorstore) -> BM25Index:
+    """Build the BM25 index from the vector store on first use"""
+    global lexical_index
+    with _lexical_index_lock:
+        if lexical_index is None:
+            lexical_index = BM25Index.from_vectorstore(vectorstore)
+    return lexical_index
+
+def dense_search(vectorstore, query: str, k: int) -> List[str]:
+    """
+    Embed the query and search the vector store, timing both stages.
+    """
+    with track_stage("embed"):
+        vector = vectorstore.embeddings.embed_query(query)
+    with track_stage("vector_search"):
+        results = vectorstore.similarity_search_by_vector(vector, k=k)
+    return [doc.page_content for doc in results]
+
+def search_documents(vectorstore, query: str, k: int = 5, hybrid: bool = False) -> List[str]:
     """
     Perform similarity search on the vector store using the provided query.
+    With hybrid=True, BM25 results are fused with the dense results using
+    reciprocal rank fusion so exact-term matches are not missed.
     """
     try:
-        results = vectorstore.similarity_search(
-            query,
-            k=k
-        )
-        return [doc.page_content for doc in results]
+        if hybrid:
+            return hybrid_search(vectorstore, query, k)
+        return dense_search(vectorstore, query, k)
     except Exception as e:
         print(f"Error performing similarity search: {str(e)}")
         return []
 
-def get_answer(query: str, context: List[str]) -> str:
+def hybrid_search(vectorstore, query: str, k: int = 5) -> List[str]:
+    """
+    Fuse dense and BM25 rankings with reciprocal rank fusion.
+    """
+    candidates = k * HYBRID_CANDIDATES
+    dense = dense_search(vectorstore, query, candidates)
+    with track_stage("bm25_search"):
+        lexical = [text for text, _ in get_lexical_index(vectorstore).search(query, candidates)]
+    return reciprocal_rank_fusion([dense, lexical], k=RRF_K)[:k]
+
+async def search_documents_async(vectorstore, query: str, k: int = 5, hybrid: bool = False) -> List[str]:
+    """
+    Run search_documents on the bounded search executor so retrieval
+    does not block the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        search_executor, search_documents, vectorstore, query, k, hybrid
+    )
+
+def similarity_search_batch(vectorstore, vectors: List[List[float]], k: int) -> List[List[str]]:
+    """
+    Top-k texts for several query vectors in one vector store call.
+    """
+    if isinstance(vectorstore, NumpyVectorStore):
+        results = vectorstore.similarity_search_by_vectors(vectors, k=k)
+        return [[doc.page_content for doc in docs] for docs in results]
+
+    collection, _ = chroma_collection(vectorstore)
+    results = collection.query(
+        query_embeddings=vectors,
+        n_results=k,
+        include=["documents"]
+    )
+    return results["documents"]
+
+def search_documents_batch(
+    vectorstore,
+    queries: List[str],
+    k: int = 5,
+    hybrid: bool = False
+) -> List[List[str]]:
+    """
+    Search for several queries at once: one embedding forward pass and one
+    batched vector search for all of them. Errors propagate, so a failed
+    search is not answered from empty contexts.
+    """
+    if not queries:
+        return []
+    n = k * HYBRID_CANDIDATES if hybrid else k
+    with track_stage("embed"):
+        vectors = vectorstore.embeddings.embed_documents(queries)
+    with track_stage("vector_search"):
+        dense = similarity_search_batch(vectorstore, vectors, n)
+    if not hybrid:
+        return dense
+
+    with track_stage("bm25_search"):
+        index = get_lexical_index(vectorstore)
+        lexical = [[text for text, _ in index.search(query, n)] for query in queries]
+    return [
+        reciprocal_rank_fusion([dense_texts, lexical_texts], k=RRF_K)[:k]
+        for dense_texts, lexical_texts in zip(dense, lexical)
+    ]
+
+async def search_documents_batch_async(
+    vectorstore,
+    queries: List[str],
+    k: int = 5,
+    hybrid: bool = False
+) -> List[List[str]]:
+    """
+    Run search_documents_batch on the bounded search executor.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        search_executor, search_documents_batch, vectorstore, queries, k, hybrid
+    )
+
+def build_messages(query: str, context: List[str]) -> List[dict]:
+    """
+    Build the chat messages for the query and its retrieved context.
+    The context is de-duplicated and packed to the prompt token budget.
+    """
+    system_prompt = f'''You are an intelligent bot that answers questions based on the provided context.
+    Context:
+    {build_context(context)}
+    
+    Please provide a clear and concise answer based on the context above.
+    If the context doesn't contain enough information to answer the question, please say so.
+    '''
+    
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": query}
+    ]
+
+async def build_messages_async(query: str, context: List[str]) -> List[dict]:
+    """
+    Run build_messages on the bounded search executor; tokenizing, merging
+    and de-duplicating the context would otherwise block the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(search_executor, build_messages, query, context)
+
+async def get_answer(query: str, context: List[str]) -> str:
     """
     Generate answer using OpenAI API based on the query and context.
     """
     try:
-        system_prompt = f'''You are an intelligent bot that answers questions based on the provided context.
-        Context: {context}
-        
-        Please provide a clear and concise answer based on the context above.
-        If the context doesn't contain enough information to answer the question, please say so.
-        '''
-        
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": query}
-        ]
-        
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=messages
-        )
+        messages = await build_messages_async(query, context)
+        with track_stage("llm"):
+            response = await get_client().chat_completion(
+                model=LLM_MODEL,
+                messages=messages
+            )
+        record_llm_usage(LLM_MODEL, response.usage)
         
         return response.choices[0].message.content
         
     except Exception as e:
         print(f"Error generating answer: {str(e)}")
-        return "Sorry, I encountered an error while generating the answer." 
\ No newline at end of file
+        return ANSWER_ERROR_MESSAGE
+
+async def stream_answer(query: str, context: List[str]) -> AsyncIterator[str]:
+    """
+    Stream the answer token by token as the OpenAI API produces it.
+    """
+    try:
+        messages = await build_messages_async(query, context)
+        start = time.perf_counter()
+        first_token = True
+        stream = await get_client().chat_completion(
+            model=LLM_MODEL,
+            messages=messages,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        
+        async for chunk in stream:
+            if chunk.usage:
+                record_llm_usage(LLM_MODEL, chunk.usage)
+            if chunk.choices and chunk.choices[0].delta.content:
+                if first_token:
+                    observe_stage("llm_first_token", time.perf_counter() - start)
+                    first_token = False
+                yield chunk.choices[0].delta.content
+        observe_stage("llm", time.perf_counter() - start)
+                
+    except Exception as e:
+        print(f"Error streaming answer: {str(e)}")
+        yield ANSWER_ERROR_MESSAGE
\ No newline at end of file
@@ -0,0 +1,169 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+class SemanticCache:
+    """
+    Cache of answered questions looked up by embedding similarity.
+
+    Questions are embedded with the same model as the vector store and kept
+    L2-normalized in a preallocated matrix, so a lookup is one matrix-vector
+    product. Entries are scoped by corpus (for invalidation) and by the
+    retrieval parameters that produced them, evicted least recently used
+    beyond max_entries and expired after ttl_seconds. max_entries <= 0
+    disables the cache.
+    """
+
+    def __init__(
+        self,
+        embeddings,
+        threshold: float = 0.92,
+        max_entries: int = 1000,
+        ttl_seconds: float = 86400.0
+    ):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.max_entries = max(max_entries, 0)
+        self.ttl_seconds = ttl_seconds
+
+        self._vectors: Optional[np.ndarray] = None
+        self._valid = np.zeros(self.max_entries, dtype=bool)
+        self._created = np.zeros(self.max_entries, dtype=np.float64)
+        self._scopes = np.empty(self.max_entries, dtype=object)
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._free = list(range(self.max_entries - 1, -1, -1))
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def embed(self, question: str) -> np.ndarray:
+        """Embed and L2-normalize a question"""
+        vector = np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(
+        self,
+        question: str,
+        corpus: str = "default",
+        params: Tuple = (),
+        vector: Optional[np.ndarray] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Return the cached answer of the most similar question above the
+        threshold, or None on a miss.
+        """
+        if vector is None:
+            vector = self.embed(question)
+        scope = (corpus, params)
+
+        with self._lock:
+            if self._vectors is None or not self._entries:
+                self.misses += 1
+                return None
+
+            same_scope = np.fromiter(
+                (s == scope for s in self._scopes), dtype=bool, count=self.max_entries
+            )
+            # Expired entries are dropped before ranking so they cannot shadow a fresh match
+            if self.ttl_seconds:
+                for slot in np.flatnonzero(self._valid & (time.monotonic() - self._created > self.ttl_seconds)):
+                    self._evict(int(slot))
+            mask = self._valid & same_scope
+            if not mask.any():
+                self.misses += 1
+                return None
+
+            similarities = self._vectors @ vector
+            similarities[~mask] = -np.inf
+            slot = int(np.argmax(similarities))
+            similarity = float(similarities[slot])
+            entry = self._entries[slot]
+
+            if similarity < self.threshold:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(slot)
+            self.hits += 1
+            return {
+                "question": entry["question"],
+                "answer": entry["answer"],
+                "context": entry["context"],
+                "similarity": similarity,
+            }
+
+    def store(
+        self,
+        question: str,
+        answer: str,
+        context: List[str],
+        corpus: str = "default",
+        params: Tuple = (),
+        vector: Optional[np.ndarray] = None
+    ):
+        """Cache an answer and its context under the question's embedding"""
+        if self.max_entries == 0:
+            return
+        if vector is None:
+            vector = self.embed(question)
+
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+            if not self._free:
+                oldest = next(iter(self._entries))
+                self._evict(oldest)
+                self.evictions += 1
+
+            slot = self._free.pop()
+            self._vectors[slot] = vector
+            self._valid[slot] = True
+            self._created[slot] = time.monotonic()
+            self._scopes[slot] = (corpus, params)
+            self._entries[slot] = {
+                "question": question,
+                "answer": answer,
+                "context": context,
+                "corpus": corpus,
+            }
+
+    def invalidate(self, corpus: Optional[str] = None) -> int:
+        """
+        Drop every entry for a corpus (or all entries when corpus is None),
+        e.g. after its documents were re-indexed. Returns the number removed.
+        """
+        with self._lock:
+            slots = [
+                slot for slot, entry in self._entries.items()
+                if corpus is None or entry["corpus"] == corpus
+            ]
+            for slot in slots:
+                self._evict(slot)
+            return len(slots)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit-rate counters used to size and tune the cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _evict(self, slot: int):
+        """Release a slot; callers must hold the lock"""
+        del self._entries[slot]
+        self._valid[slot] = False
+        self._scopes[slot] = None
+        self._free.append(slot)
@@ -1,43 +1,137 @@
+import os
+import json
+import time
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
 from typing import List
 
-from db import create_vectorstore
-from search import search_documents, get_answer
+from context_builder import get_encoder
+from db import create_vectorstore, initialize_embeddings, sync_vectorstore
+from metrics import MetricsMiddleware, metrics_response
+from search import (
+    search_documents,
+    search_documents_async,
+    search_documents_batch_async,
+    get_answer,
+    get_client,
+    get_lexical_index,
+    get_reranker,
+    stream_answer,
+    search_executor
+)
+
+# Limits for /query/batch
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "256"))
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "8"))
+
+# Loaded by the lifespan hook, see initialize()
+vectorstore = None
+startup = {"ready": False, "error": None, "seconds": {}}
+
+def timed_step(name: str, fn, *args):
+    """Run one startup step and record how long it took"""
+    start = time.perf_counter()
+    result = fn(*args)
+    startup["seconds"][name] = round(time.perf_counter() - start, 3)
+    return result
+
+def initialize():
+    """
+    Load models and the index, then run warm-up inference so the first
+    real query does not pay for it.
+    """
+    global vectorstore
+    embeddings = timed_step("embeddings", initialize_embeddings)
+    vectorstore = timed_step("vectorstore", create_vectorstore, None, embeddings)
+    timed_step("lexical_index", get_lexical_index, vectorstore)
+    reranker = timed_step("reranker", get_reranker)
+    timed_step("llm_client", get_client)
+    timed_step("tokenizer", get_encoder)
+
+    timed_step("warmup_embedding", embeddings.embed_query, "warm up")
+    timed_step("warmup_rerank", reranker.model.predict, [["warm up", "warm up"]])
+    timed_step("warmup_search", search_documents, vectorstore, "warm up", 2, 1)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Start loading in the background so liveness checks answer immediately;
+    readiness flips once initialize() completes.
+    """
+    async def load():
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        try:
+            await loop.run_in_executor(None, initialize)
+            startup["ready"] = True
+        except Exception as e:
+            startup["error"] = str(e)
+            print(f"Error during startup: {str(e)}")
+        startup["seconds"]["total"] = round(time.perf_counter() - start, 3)
+
+    task = asyncio.create_task(load())
+    yield
+    task.cancel()
 
 # Initialize FastAPI app
 app = FastAPI(
     title="Retrieve and Rerank API",
     description="API for answering questions using retrieve and rerank system",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
+app.add_middleware(MetricsMiddleware)
 
-# Initialize vector store
-vectorstore = create_vectorstore()
+def require_ready():
+    """
+    Reject requests until models and index are loaded.
+    """
+    if not startup["ready"]:
+        raise HTTPException(status_code=503, detail="Service is starting up")
 
 class Query(BaseModel):
     question: str
-    k: int = 10  # Number of documents to retrieve before reranking
+    k: int = Field(10, ge=1)  # Number of documents to retrieve before reranking
+    top_k: int = Field(3, ge=1)  # Number of documents kept after reranking
+    cascade: bool = False  # Only rerank the ambiguous band of the dense results
+    hybrid: bool = False  # Fuse BM25 and dense results before reranking
 
 class Response(BaseModel):
     answer: str
     context: List[str]
 
+class BatchQuery(BaseModel):
+    questions: List[str]
+    k: int = Field(10, ge=1)  # Number of documents to retrieve per question before reranking
+    top_k: int = Field(3, ge=1)  # Number of documents kept per question after reranking
+    hybrid: bool = False  # Fuse BM25 and dense results before reranking
+
+class BatchResponse(BaseModel):
+    results: List[Response]
+
 @app.post("/query", response_model=Response)
 async def answer_query(query: Query):
     """
     Endpoint to answer questions using the retrieve and rerank system.
     The system will:
-    1. Retrieve k documents using similarity search
+    1. Retrieve k documents using similarity search (fused with BM25 when hybrid)
     2. Rerank the documents using a cross-encoder model
-    3. Use the top 5 reranked documents to generate an answer
+    3. Use the top_k reranked documents to generate an answer
+    With cascade enabled, clear winners and losers are decided from the
+    dense scores and only the ambiguous band is reranked.
     """
+    require_ready()
     try:
         # Get relevant context (includes reranking)
-        context = search_documents(vectorstore, query.question, query.k)
+        context = await search_documents_async(
+            vectorstore, query.question, query.k, query.top_k, query.cascade, query.hybrid
+        )
         
         # Generate answer
-        answer = get_answer(query.question, context)
+        answer = await get_answer(query.question, context)
         
         return Response(
             answer=answer,
@@ -50,6 +144,137 @@ async def answer_query(query: Query):
             detail=f"Error processing query: {str(e)}"
         )
 
+@app.post("/query/batch", response_model=BatchResponse)
+async def answer_batch(batch: BatchQuery):
+    """
+    Answer many questions in one request. All questions are embedded in one
+    forward pass, searched together and every (question, document) pair is
+    reranked in a single cross-encoder call. The LLM calls then run
+    concurrently with at most BATCH_LLM_CONCURRENCY in flight. Results keep
+    the order of the questions.
+    """
+    require_ready()
+    if len(batch.questions) > BATCH_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {BATCH_MAX_QUESTIONS} questions per batch"
+        )
+    try:
+        contexts = await search_documents_batch_async(
+            vectorstore, batch.questions, batch.k, batch.top_k, batch.hybrid
+        )
+
+        semaphore = asyncio.Semaphore(BATCH_LLM_CONCURRENCY)
+
+        async def answer(question: str, context: List[str]) -> Response:
+            async with semaphore:
+                return Response(answer=await get_answer(question, context), context=context)
+
+        results = await asyncio.gather(*(
+            answer(question, context) for question, context in zip(batch.questions, contexts)
+        ))
+        return BatchResponse(results=results)
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error processing batch: {str(e)}"
+        )
+
+def format_sse(event: str, data) -> str:
+    """
+    Format a server-sent event with a JSON encoded payload.
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/query/stream")
+async def stream_query(query: Query):
+    """
+    Streaming variant of /query using server-sent events.
+    Emits one `context` event with the retrieved documents, then a `token`
+    event per generated chunk and a final `done` event.
+    """
+    require_ready()
+    try:
+        context = await search_documents_async(
+            vectorstore, query.question, query.k, query.top_k, query.cascade, query.hybrid
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error processing query: {str(e)}"
+        )
+
+    async def event_stream():
+        yield format_sse("context", context)
+        async for token in stream_answer(query.question, context):
+            yield format_sse("token", token)
+        yield format_sse("done", {})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """
+    Hit-rate counters for the cross-encoder score cache.
+    """
+    require_ready()
+    cache = get_reranker().cache
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+# Serializes index syncs triggered through the API
+sync_lock = asyncio.Lock()
+
+@app.post("/index/sync")
+async def sync_index():
+    """
+    Incrementally re-index the document folder and apply the same changes
+    to the BM25 index.
+    """
+    require_ready()
+    loop = asyncio.get_running_loop()
+    async with sync_lock:
+        return await loop.run_in_executor(
+            search_executor,
+            lambda: sync_vectorstore(vectorstore, lexical_index=get_lexical_index(vectorstore))
+        )
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Prometheus metrics: per-stage latency, LLM tokens, rerank cache hits
+    and in-flight requests.
+    """
+    return metrics_response()
+
+@app.get("/health/live")
+async def liveness():
+    """
+    Liveness probe: the process is up and serving HTTP.
+    """
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness():
+    """
+    Readiness probe: models and index are loaded and warmed up.
+    Also reports the cold-start time of each component.
+    """
+    return JSONResponse(
+        status_code=200 if startup["ready"] else 503,
+        content={
+            "ready": startup["ready"],
+            "error": startup["error"],
+            "startup_seconds": startup["seconds"]
+        }
+    )
+
 @app.get("/")
 async def root():
     """
@@ -0,0 +1,105 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Sequence
+
+import numpy as np
+
+class _PendingRequest:
+    """Pairs submitted by one caller together with the future for their scores"""
+    __slots__ = ("pairs", "future")
+
+    def __init__(self, pairs: Sequence[Sequence[str]]):
+        self.pairs = pairs
+        self.future = Future()
+
+class BatchScheduler:
+    """
+    Coalesce (query, doc) pairs from concurrent callers into a single predict call.
+
+    A background thread waits for the first request, then keeps collecting
+    requests until either max_batch_size pairs are queued or max_wait_ms has
+    passed. The merged batch is scored in one call and the scores are fanned
+    back out to each caller in submission order.
+    """
+
+    def __init__(
+        self,
+        predict_fn: Callable[[List[Sequence[str]]], np.ndarray],
+        max_batch_size: int = 64,
+        max_wait_ms: float = 5.0
+    ):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name="rerank-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, pairs: Sequence[Sequence[str]]) -> Future:
+        """Queue pairs for scoring and return a future resolving to their scores"""
+        if self._closed:
+            raise RuntimeError("BatchScheduler is closed")
+        request = _PendingRequest(pairs)
+        self._queue.put(request)
+        return request.future
+
+    def score(self, pairs: Sequence[Sequence[str]]) -> np.ndarray:
+        """Score pairs through the scheduler, blocking until the batch completes"""
+        if not pairs:
+            return np.array([], dtype=np.float32)
+        return self.submit(pairs).result()
+
+    def close(self):
+        """Stop the worker thread once the queued requests are drained"""
+        self._closed = True
+        self._queue.put(None)
+        self._worker.join()
+
+    def _collect(self, first: _PendingRequest) -> List[_PendingRequest]:
+        """Gather requests until the batch is full or the wait window expires"""
+        batch = [first]
+        size = len(first.pairs)
+        deadline = time.monotonic() + self.max_wait
+
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request is None:
+                # Re-queue the sentinel so the run loop exits after this batch
+                self._queue.put(None)
+                break
+            batch.append(request)
+            size += len(request.pairs)
+
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+
+            batch = self._collect(first)
+            pairs = [pair for request in batch for pair in request.pairs]
+
+            try:
+                scores = np.asarray(self.predict_fn(pairs))
+            except Exception as e:
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+
+            # Fan scores back out to each caller
+            offset = 0
+            for request in batch:
+                count = len(request.pairs)
+                request.future.set_result(scores[offset:offset + count])
+                offset += count
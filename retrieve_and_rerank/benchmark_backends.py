@@ -0,0 +1,126 @@
+import argparse
+import gc
+import time
+from typing import Callable, Dict
+
+import numpy as np
+import psutil
+
+from benchmark_rerank import PASSAGES, QUERIES
+from db import initialize_embeddings
+from rerank import Reranker
+
+def rss_mb() -> float:
+    """Resident memory of this process in MB"""
+    return psutil.Process().memory_info().rss / (1024 * 1024)
+
+def measure(fn: Callable[[], object], repeats: int) -> Dict[str, float]:
+    """Latency percentiles of repeated calls"""
+    fn()
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    return {
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p95_ms": float(np.percentile(latencies, 95) * 1000),
+        "mean_s": float(np.mean(latencies)),
+    }
+
+def load(backend: str):
+    """Load both models for a backend and report the memory they added"""
+    gc.collect()
+    before = rss_mb()
+    start = time.perf_counter()
+    embeddings = initialize_embeddings(backend=backend)
+    reranker = Reranker(backend=backend, batching=False, cache_size=0)
+    load_s = time.perf_counter() - start
+    return embeddings, reranker, load_s, rss_mb() - before
+
+def top_k_overlap(a: np.ndarray, b: np.ndarray, k: int) -> float:
+    """Fraction of shared items between the top-k of two score vectors"""
+    return len(set(np.argsort(-a)[:k]) & set(np.argsort(-b)[:k])) / k
+
+def spearman(a: np.ndarray, b: np.ndarray) -> float:
+    """Spearman rank correlation (no tie handling, scores are continuous)"""
+    ra = np.argsort(np.argsort(a))
+    rb = np.argsort(np.argsort(b))
+    return float(np.corrcoef(ra, rb)[0, 1])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare the PyTorch and int8 ONNX inference backends",
+        epilog="Needs the optional dependencies: pip install -r requirements-onnx.txt"
+    )
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument("--batch", type=int, default=64, help="Texts per batch in the throughput runs")
+    parser.add_argument("--k", type=int, default=3, help="Top-k used for ranking agreement")
+    args = parser.parse_args()
+
+    batch_texts = [PASSAGES[i % len(PASSAGES)] for i in range(args.batch)]
+    batch_pairs = [[QUERIES[i % len(QUERIES)], text] for i, text in enumerate(batch_texts)]
+    results = {}
+
+    for backend in ["torch", "onnx"]:
+        embeddings, reranker, load_s, memory_mb = load(backend)
+
+        embed_query = measure(lambda: embeddings.embed_query(QUERIES[0]), args.repeats)
+        embed_batch = measure(lambda: embeddings.embed_documents(batch_texts), max(args.repeats // 5, 1))
+        rerank_10 = measure(lambda: reranker.score_pairs(batch_pairs[:10]), args.repeats)
+        rerank_batch = measure(lambda: reranker.score_pairs(batch_pairs), max(args.repeats // 5, 1))
+
+        # Outputs kept for the agreement comparison
+        doc_vectors = np.asarray(embeddings.embed_documents(PASSAGES))
+        query_vectors = np.asarray(embeddings.embed_documents(QUERIES))
+        rerank_scores = [
+            np.asarray(reranker.score_pairs([[query, passage] for passage in PASSAGES]))
+            for query in QUERIES
+        ]
+
+        results[backend] = {
+            "load_s": load_s,
+            "memory_mb": memory_mb,
+            "embed_query": embed_query,
+            "embed_batch": embed_batch,
+            "rerank_10": rerank_10,
+            "rerank_batch": rerank_batch,
+            "dense_scores": query_vectors @ doc_vectors.T,
+            "rerank_scores": rerank_scores,
+        }
+        del embeddings, reranker
+
+    print(f"{'metric':<30} {'torch':>12} {'onnx':>12}")
+    print(f"{'load time (s)':<30} {results['torch']['load_s']:>12.2f} {results['onnx']['load_s']:>12.2f}")
+    print(f"{'memory added (MB)':<30} {results['torch']['memory_mb']:>12.1f} {results['onnx']['memory_mb']:>12.1f}")
+    for name, label in [
+        ("embed_query", "embed query p50 (ms)"),
+        ("rerank_10", "rerank 10 pairs p50 (ms)"),
+    ]:
+        print(f"{label:<30} {results['torch'][name]['p50_ms']:>12.2f} {results['onnx'][name]['p50_ms']:>12.2f}")
+        label = label.replace("p50", "p95")
+        print(f"{label:<30} {results['torch'][name]['p95_ms']:>12.2f} {results['onnx'][name]['p95_ms']:>12.2f}")
+    for name, label in [
+        ("embed_batch", "embed throughput (texts/s)"),
+        ("rerank_batch", "rerank throughput (pairs/s)"),
+    ]:
+        torch_rate = args.batch / results["torch"][name]["mean_s"]
+        onnx_rate = args.batch / results["onnx"][name]["mean_s"]
+        print(f"{label:<30} {torch_rate:>12.1f} {onnx_rate:>12.1f}")
+
+    # Ranking agreement of the ONNX backend against PyTorch
+    dense_overlap = np.mean([
+        top_k_overlap(t, o, args.k)
+        for t, o in zip(results["torch"]["dense_scores"], results["onnx"]["dense_scores"])
+    ])
+    rerank_overlap = np.mean([
+        top_k_overlap(t, o, args.k)
+        for t, o in zip(results["torch"]["rerank_scores"], results["onnx"]["rerank_scores"])
+    ])
+    rerank_spearman = np.mean([
+        spearman(t, o)
+        for t, o in zip(results["torch"]["rerank_scores"], results["onnx"]["rerank_scores"])
+    ])
+    print(f"\nDense retrieval top-{args.k} overlap:  {dense_overlap:.3f}")
+    print(f"Rerank top-{args.k} overlap:           {rerank_overlap:.3f}")
+    print(f"Rerank Spearman correlation:     {rerank_spearman:.3f}")
@@ -0,0 +1,82 @@
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List
+
+import numpy as np
+
+from batcher import BatchScheduler
+from rerank import Reranker
+
+QUERIES = [
+    "What is multi-head attention?",
+    "How are positional encodings computed?",
+    "Why is self-attention faster than recurrence?",
+    "What optimizer and learning rate schedule were used?",
+]
+
+PASSAGES = [
+    "Multi-head attention allows the model to jointly attend to information from different representation subspaces at different positions.",
+    "We use sine and cosine functions of different frequencies to encode the position of each token in the sequence.",
+    "A self-attention layer connects all positions with a constant number of sequentially executed operations, whereas a recurrent layer requires O(n) sequential operations.",
+    "We used the Adam optimizer with beta1 = 0.9, beta2 = 0.98 and varied the learning rate over the course of training with warmup steps.",
+    "The encoder is composed of a stack of N = 6 identical layers, each with a multi-head self-attention mechanism and a feed-forward network.",
+    "Residual dropout is applied to the output of each sub-layer before it is added to the sub-layer input and normalized.",
+    "On the WMT 2014 English-to-German translation task the big transformer model outperforms the best previously reported models.",
+    "Label smoothing of value 0.1 hurts perplexity as the model learns to be more unsure but improves accuracy and BLEU score.",
+    "Scaled dot-product attention divides the dot products of the queries with all keys by the square root of the key dimension.",
+    "The decoder inserts a third sub-layer which performs multi-head attention over the output of the encoder stack.",
+]
+
+def run(score_fn: Callable[[List[List[str]]], np.ndarray], clients: int, requests: int, pairs_per_request: int):
+    """Issue requests from concurrent clients and collect per-request latencies"""
+    def one(i: int) -> float:
+        query = QUERIES[i % len(QUERIES)]
+        docs = [PASSAGES[(i + j) % len(PASSAGES)] for j in range(pairs_per_request)]
+        start = time.perf_counter()
+        score_fn([[query, doc] for doc in docs])
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        latencies = list(pool.map(one, range(requests)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "pairs_per_s": requests * pairs_per_request / elapsed,
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p95_ms": float(np.percentile(latencies, 95) * 1000),
+    }
+
+def report(name: str, result: dict):
+    print(f"{name:<28} {result['pairs_per_s']:>10.1f} {result['p50_ms']:>9.1f} {result['p95_ms']:>9.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare per-request and micro-batched cross-encoder scoring")
+    parser.add_argument("--clients", type=int, default=16, help="Concurrent callers")
+    parser.add_argument("--requests", type=int, default=200, help="Total rerank requests per mode")
+    parser.add_argument("--pairs", type=int, default=10, help="(query, doc) pairs per request")
+    parser.add_argument("--max-batch-size", type=int, default=64)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    # Disable the score cache so every pair really reaches the model
+    reranker = Reranker(batching=False, cache_size=0)
+    # Warm up the model so the first mode does not pay for lazy initialization
+    reranker.score_pairs([[QUERIES[0], PASSAGES[0]]])
+
+    print(f"{args.clients} clients, {args.requests} requests x {args.pairs} pairs")
+    print(f"{'mode':<28} {'pairs/s':>10} {'p50(ms)':>9} {'p95(ms)':>9}")
+
+    report("per-request", run(reranker.score_pairs, args.clients, args.requests, args.pairs))
+
+    scheduler = BatchScheduler(
+        reranker.model.predict,
+        max_batch_size=args.max_batch_size,
+        max_wait_ms=args.max_wait_ms
+    )
+    report(
+        f"batched ({args.max_batch_size}, {args.max_wait_ms}ms)",
+        run(scheduler.score, args.clients, args.requests, args.pairs)
+    )
+    scheduler.close()
@@ -0,0 +1,142 @@
+import re
+import math
+import threading
+from array import array
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+# Keeps identifiers like "BLEU", "4.2", "EN-DE" or "d_model" as single terms
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[._\-][a-z0-9]+)*")
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens for lexical matching"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+class BM25Index:
+    """
+    Incremental Okapi BM25 inverted index over text chunks.
+
+    Postings are stored per term as two compact typed arrays (document slot
+    and term frequency) rather than Python objects. Removed chunks leave an
+    empty slot that is skipped at query time, and the index compacts itself
+    once dead slots exceed compact_ratio of the total.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, compact_ratio: float = 0.25):
+        self.k1 = k1
+        self.b = b
+        self.compact_ratio = compact_ratio
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._terms: Dict[str, int] = {}
+        self._postings_slots: List[array] = []
+        self._postings_tfs: List[array] = []
+        self._ids: List[str] = []
+        self._texts: List[str] = []
+        self._lengths = array("I")
+        self._slots: Dict[str, int] = {}
+        self._total_length = 0
+        self._dead = 0
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def add(self, ids: Sequence[str], texts: Sequence[str]):
+        """Index chunks, replacing any already indexed under the same id"""
+        with self._lock:
+            self.remove([doc_id for doc_id in ids if doc_id in self._slots])
+            for doc_id, text in zip(ids, texts):
+                slot = len(self._ids)
+                tokens = tokenize(text)
+                counts: Dict[str, int] = {}
+                for token in tokens:
+                    counts[token] = counts.get(token, 0) + 1
+                for term, tf in counts.items():
+                    term_id = self._terms.get(term)
+                    if term_id is None:
+                        term_id = self._terms[term] = len(self._postings_slots)
+                        self._postings_slots.append(array("I"))
+                        self._postings_tfs.append(array("H"))
+                    self._postings_slots[term_id].append(slot)
+                    self._postings_tfs[term_id].append(min(tf, 65535))
+
+                self._ids.append(doc_id)
+                self._texts.append(text)
+                self._lengths.append(len(tokens))
+                self._slots[doc_id] = slot
+                self._total_length += len(tokens)
+
+    def remove(self, ids: Iterable[str]):
+        """Drop chunks by id; their postings are skipped until the next compaction"""
+        with self._lock:
+            for doc_id in ids:
+                slot = self._slots.pop(doc_id, None)
+                if slot is None:
+                    continue
+                self._total_length -= self._lengths[slot]
+                self._lengths[slot] = 0
+                self._texts[slot] = ""
+                self._dead += 1
+            if self._ids and self._dead > self.compact_ratio * len(self._ids):
+                self._compact()
+
+    def _compact(self):
+        """Rebuild the postings without dead slots"""
+        live = [(doc_id, self._texts[slot]) for doc_id, slot in self._slots.items()]
+        self._reset()
+        self.add([doc_id for doc_id, _ in live], [text for _, text in live])
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[str, float]]:
+        """Top-k (text, BM25 score) pairs for the query"""
+        with self._lock:
+            if not self._slots:
+                return []
+            lengths = np.frombuffer(self._lengths, dtype=np.uint32).astype(np.float32)
+            n_docs = len(self._slots)
+            avg_length = self._total_length / n_docs if n_docs else 1.0
+            norm = self.k1 * (1 - self.b + self.b * lengths / max(avg_length, 1e-9))
+            scores = np.zeros(len(self._ids), dtype=np.float32)
+
+            for term in set(tokenize(query)):
+                term_id = self._terms.get(term)
+                if term_id is None:
+                    continue
+                slots = np.frombuffer(self._postings_slots[term_id], dtype=np.uint32)
+                tfs = np.frombuffer(self._postings_tfs[term_id], dtype=np.uint16).astype(np.float32)
+                live = lengths[slots] > 0
+                df = int(live.sum())
+                if df == 0:
+                    continue
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                slots, tfs = slots[live], tfs[live]
+                scores[slots] += idf * tfs * (self.k1 + 1) / (tfs + norm[slots])
+
+            matched = np.flatnonzero(scores)
+            if len(matched) == 0:
+                return []
+            k = min(k, len(matched))
+            top = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+            top = top[np.argsort(-scores[top])]
+            return [(self._texts[slot], float(scores[slot])) for slot in top]
+
+    @classmethod
+    def from_vectorstore(cls, vectorstore, **kwargs) -> "BM25Index":
+        """Build the index from every chunk currently stored in the vector store"""
+        index = cls(**kwargs)
+        stored = vectorstore.get()
+        index.add(stored["ids"], stored["documents"])
+        return index
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60) -> List[str]:
+    """
+    Fuse ranked lists of texts: each text scores sum(1 / (k + rank)) over
+    the lists it appears in, so agreement between retrievers wins.
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, text in enumerate(ranking, start=1):
+            scores[text] = scores.get(text, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
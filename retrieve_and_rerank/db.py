@@ -1,48 +1,371 @@
 import os
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple
 from langchain.vectorstores import Chroma
 from langchain.embeddings import HuggingFaceEmbeddings
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.document_loaders import DirectoryLoader, PyPDFLoader
+from langchain.document_loaders import PyPDFLoader
+
+from numpy_store import NumpyVectorStore
+
+DOCUMENTS_DIR = "../document/"
+
+# "chroma" (default) or "numpy" for the memory-mapped NumpyVectorStore
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma").lower()
+# float32, or float16 / int8 scanning with float32 rescoring (numpy backend only)
+NUMPY_INDEX_DTYPE = os.getenv("NUMPY_INDEX_DTYPE", "float32")
+# "exact" or "ivf" approximate search once the index holds IVF_MIN_ROWS chunks (numpy backend only)
+NUMPY_INDEX_TYPE = os.getenv("NUMPY_INDEX_TYPE", "exact")
+IVF_NLIST = int(os.getenv("IVF_NLIST", "0")) or None
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "8"))
+IVF_MIN_ROWS = int(os.getenv("IVF_MIN_ROWS", "10000"))
+# Writes add rows to the nearest existing cell; once the rows changed since the last
+# build exceed this fraction, the next write re-runs k-means over the whole index
+IVF_MAX_DRIFT = float(os.getenv("IVF_MAX_DRIFT", "0.2"))
+PERSIST_DIRECTORY = "./numpy_index" if VECTOR_BACKEND == "numpy" else "./chroma_db"
+# Records file and chunk hashes of everything currently in the index
+MANIFEST_PATH = os.path.join(PERSIST_DIRECTORY, "manifest.json")
+
+# Ingestion tuning
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(os.cpu_count() or 1)))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+EMBED_MULTI_PROCESS = os.getenv("EMBED_MULTI_PROCESS", "false").lower() in ("1", "true", "yes")
+# New chunks embedded and written before the manifest is saved, so an interrupted sync resumes there
+SYNC_COMMIT_CHUNKS = int(os.getenv("SYNC_COMMIT_CHUNKS", "1024"))
+# Upsert size for Chroma clients that do not report their own limit
+CHROMA_DEFAULT_BATCH_SIZE = 5000
+# "torch" (default) or "onnx" for the int8-quantized ONNX Runtime models
+# (the onnx backend needs pip install -r requirements-onnx.txt)
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch").lower()
+
+def initialize_embeddings(
+    batch_size: int = EMBED_BATCH_SIZE,
+    multi_process: bool = EMBED_MULTI_PROCESS,
+    backend: str = INFERENCE_BACKEND
+):
+    """
+    Initialize HuggingFace embeddings.
+
+    multi_process spreads embedding batches over one worker process per core,
+    which pays off for large builds but not for single query embeddings.
+    The onnx backend runs the same model exported to ONNX with int8 dynamic
+    quantization, producing vectors compatible with an index built by torch.
+    """
+    if backend == "onnx":
+        from onnx_backend import ONNXEmbeddings
+        return ONNXEmbeddings(
+            model_name="sentence-transformers/all-MiniLM-L6-v2",
+            batch_size=batch_size
+        )
 
-def initialize_embeddings():
-    """Initialize HuggingFace embeddings"""
     return HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-MiniLM-L6-v2"
+        model_name="sentence-transformers/all-MiniLM-L6-v2",
+        multi_process=multi_process,
+        encode_kwargs={"batch_size": batch_size}
+    )
+
+def get_text_splitter():
+    """Text splitter shared by full builds and incremental syncs"""
+    return RecursiveCharacterTextSplitter(
+        chunk_size=1000,
+        chunk_overlap=200,
+        length_function=len,
+        separators=["\n\n", "\n", " ", ""]
     )
 
-def create_vectorstore():
-    """Create or load the vector store"""
-    embeddings = initialize_embeddings()
-    
-    if not os.path.exists("./chroma_db"):
-        # Load documents
-        documents_dir = "../document/"
-        loader = DirectoryLoader(
-            documents_dir,
-            glob="**/*.pdf",
-            loader_cls=PyPDFLoader,
-            show_progress=True
+def file_hash(path: str) -> str:
+    """SHA-256 of a file's content"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def chunk_ids(source: str, chunks) -> List[str]:
+    """
+    Deterministic chunk ids derived from the source file and chunk content,
+    so an unchanged chunk keeps its id across re-indexing.
+    """
+    ids = []
+    seen: Dict[str, int] = {}
+    for chunk in chunks:
+        digest = hashlib.sha256(f"{source}\0{chunk.page_content}".encode("utf-8")).hexdigest()
+        # Disambiguate identical chunks within the same file
+        seen[digest] = seen.get(digest, 0) + 1
+        ids.append(f"{digest}-{seen[digest]}")
+    return ids
+
+def list_pdfs(documents_dir: str = DOCUMENTS_DIR) -> Dict[str, str]:
+    """Map of path relative to documents_dir -> path of every PDF in the corpus"""
+    pdfs = {}
+    for root, _, files in os.walk(documents_dir):
+        for name in sorted(files):
+            if name.lower().endswith(".pdf"):
+                path = os.path.join(root, name)
+                pdfs[os.path.relpath(path, documents_dir)] = path
+    return pdfs
+
+def load_and_split(path: str):
+    """Load one PDF and split it into chunks"""
+    documents = PyPDFLoader(path).load()
+    return get_text_splitter().split_documents(documents)
+
+def load_and_split_parallel(paths: List[str], max_workers: int = INGEST_WORKERS) -> List[List]:
+    """
+    Parse and split PDFs in a process pool.
+
+    Returns the chunks of each path, in the order of paths.
+    """
+    if max_workers <= 1 or len(paths) <= 1:
+        return [load_and_split(path) for path in paths]
+    with ProcessPoolExecutor(max_workers=min(max_workers, len(paths))) as pool:
+        return list(pool.map(load_and_split, paths))
+
+def embed_in_batches(embeddings, texts: List[str], batch_size: int = EMBED_BATCH_SIZE) -> List[List[float]]:
+    """Embed texts in fixed-size batches"""
+    vectors = []
+    for start in range(0, len(texts), batch_size):
+        vectors.extend(embeddings.embed_documents(texts[start:start + batch_size]))
+    return vectors
+
+def chroma_collection(vectorstore) -> Tuple[object, int]:
+    """
+    The chromadb collection behind a LangChain Chroma store and the largest
+    batch its client accepts.
+
+    LangChain's Chroma only takes texts it embeds itself, so precomputed
+    vectors and batched queries go to the collection directly. This is the
+    one place that reaches into its private attributes, and it checks them
+    so a LangChain or chromadb upgrade fails loudly instead of silently.
+    """
+    collection = getattr(vectorstore, "_collection", None)
+    if collection is None or not hasattr(collection, "upsert"):
+        raise TypeError(f"{type(vectorstore).__name__} does not expose a chromadb collection")
+    client = getattr(vectorstore, "_client", None)
+    if hasattr(client, "get_max_batch_size"):
+        # chromadb >= 0.5
+        max_batch = client.get_max_batch_size()
+    else:
+        # chromadb 0.4.x, where older releases have no limit at all
+        max_batch = getattr(client, "max_batch_size", None)
+    return collection, max_batch or CHROMA_DEFAULT_BATCH_SIZE
+
+def write_chunks(vectorstore, ids: List[str], chunks, vectors: List[List[float]]):
+    """
+    Bulk write precomputed embeddings to the vector store. Chroma is written
+    in the largest batches the client accepts.
+    """
+    if isinstance(vectorstore, NumpyVectorStore):
+        vectorstore.upsert_embeddings(
+            ids,
+            vectors,
+            [c.page_content for c in chunks],
+            [c.metadata for c in chunks]
         )
-        documents = loader.load()
-        
-        # Split documents into chunks
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            length_function=len,
-            separators=["\n\n", "\n", " ", ""]
+        return
+
+    collection, max_batch = chroma_collection(vectorstore)
+    for start in range(0, len(ids), max_batch):
+        end = start + max_batch
+        collection.upsert(
+            ids=ids[start:end],
+            embeddings=vectors[start:end],
+            documents=[c.page_content for c in chunks[start:end]],
+            metadatas=[c.metadata or None for c in chunks[start:end]]
         )
-        texts = text_splitter.split_documents(documents)
-        
-        # Create vector store
-        return Chroma.from_documents(
-            documents=texts,
-            embedding=embeddings,
-            persist_directory="./chroma_db"
+
+def add_chunks(
+    vectorstore,
+    ids: List[str],
+    chunks,
+    embeddings=None,
+    batch_size: int = EMBED_BATCH_SIZE
+):
+    """Embed chunks in batches and write them to the vector store in bulk"""
+    if not ids:
+        return
+    embeddings = embeddings or vectorstore.embeddings
+    vectors = embed_in_batches(embeddings, [c.page_content for c in chunks], batch_size)
+    write_chunks(vectorstore, ids, chunks, vectors)
+
+def load_manifest(manifest_path: str = MANIFEST_PATH) -> Dict:
+    """Load the index manifest, or an empty one if none was written yet"""
+    if not os.path.exists(manifest_path):
+        return {"files": {}}
+    with open(manifest_path) as f:
+        return json.load(f)
+
+def save_manifest(manifest: Dict, manifest_path: str = MANIFEST_PATH):
+    """Atomically write the index manifest"""
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+def write_sync_batch(
+    vectorstore,
+    new_ids: List[str],
+    new_chunks,
+    stale_ids: List[str],
+    embeddings=None,
+    batch_size: int = EMBED_BATCH_SIZE,
+    lexical_index=None
+):
+    """Embed and write the new chunks of a group of files and delete their stale ones"""
+    add_chunks(vectorstore, new_ids, new_chunks, embeddings, batch_size)
+    if stale_ids:
+        vectorstore.delete(ids=stale_ids)
+
+    # Keep the lexical index in step with the vector store
+    if lexical_index is not None:
+        lexical_index.add(new_ids, [chunk.page_content for chunk in new_chunks])
+        lexical_index.remove(stale_ids)
+
+def sync_vectorstore(
+    vectorstore,
+    documents_dir: str = DOCUMENTS_DIR,
+    manifest_path: str = MANIFEST_PATH,
+    max_workers: int = INGEST_WORKERS,
+    batch_size: int = EMBED_BATCH_SIZE,
+    embeddings=None,
+    lexical_index=None,
+    commit_chunks: int = SYNC_COMMIT_CHUNKS
+) -> Dict[str, int]:
+    """
+    Bring the vector store in line with the PDFs in documents_dir.
+
+    Unchanged files are skipped without parsing. New or changed files are
+    parsed in a process pool, only chunks whose content hash is not already
+    indexed are embedded (in batches) and written in bulk, and chunks of
+    removed or changed files that no longer exist are deleted. When a
+    BM25 lexical_index is given it receives the same adds and deletes.
+
+    Files are written in groups of about commit_chunks new chunks and the
+    manifest is saved after each group, so an interrupted sync only redoes
+    the group it was writing.
+
+    Returns:
+        Report of the work done and skipped
+    """
+    manifest = load_manifest(manifest_path)
+    indexed = manifest["files"]
+    current = list_pdfs(documents_dir)
+    report = {
+        "files_added": 0,
+        "files_changed": 0,
+        "files_removed": 0,
+        "files_unchanged": 0,
+        "chunks_added": 0,
+        "chunks_deleted": 0,
+        "chunks_skipped": 0,
+    }
+
+    # Drop chunks of files that disappeared from the corpus
+    for name in sorted(set(indexed) - set(current)):
+        stale_ids = indexed.pop(name)["chunks"]
+        if stale_ids:
+            vectorstore.delete(ids=stale_ids)
+            if lexical_index is not None:
+                lexical_index.remove(stale_ids)
+        report["files_removed"] += 1
+        report["chunks_deleted"] += len(stale_ids)
+    if report["files_removed"]:
+        save_manifest(manifest, manifest_path)
+
+    # Find new or changed files without parsing the unchanged ones
+    pending = {}
+    for name, path in current.items():
+        digest = file_hash(path)
+        previous = indexed.get(name)
+        if previous is not None and previous["hash"] == digest:
+            report["files_unchanged"] += 1
+            report["chunks_skipped"] += len(previous["chunks"])
+        else:
+            pending[name] = digest
+
+    names = list(pending)
+    parsed = load_and_split_parallel([current[name] for name in names], max_workers)
+
+    new_ids, new_chunks, stale_ids, entries = [], [], [], {}
+    for position, (name, chunks) in enumerate(zip(names, parsed)):
+        previous = indexed.get(name)
+        ids = chunk_ids(name, chunks)
+        old_ids = set(previous["chunks"]) if previous else set()
+
+        # Only embed chunks that are not already in the index
+        added = 0
+        for chunk_id, chunk in zip(ids, chunks):
+            if chunk_id not in old_ids:
+                new_ids.append(chunk_id)
+                new_chunks.append(chunk)
+                added += 1
+        removed = sorted(old_ids - set(ids))
+        stale_ids.extend(removed)
+
+        entries[name] = {"hash": pending[name], "chunks": ids}
+        report["files_changed" if previous else "files_added"] += 1
+        report["chunks_added"] += added
+        report["chunks_deleted"] += len(removed)
+        report["chunks_skipped"] += len(ids) - added
+
+        # Write whole files once enough new chunks are pending, and after the last file
+        if len(new_ids) >= commit_chunks or position == len(names) - 1:
+            write_sync_batch(vectorstore, new_ids, new_chunks, stale_ids, embeddings, batch_size, lexical_index)
+            # Files only enter the manifest once their chunks are written
+            indexed.update(entries)
+            save_manifest(manifest, manifest_path)
+            new_ids, new_chunks, stale_ids, entries = [], [], [], {}
+
+    save_manifest(manifest, manifest_path)
+    return report
+
+def open_vectorstore(embeddings, backend: str = VECTOR_BACKEND, persist_directory: str = PERSIST_DIRECTORY):
+    """Open (or create empty) the vector store for a backend"""
+    if backend == "numpy":
+        return NumpyVectorStore(
+            persist_directory=persist_directory,
+            embedding_function=embeddings,
+            dtype=NUMPY_INDEX_DTYPE,
+            index=NUMPY_INDEX_TYPE,
+            nlist=IVF_NLIST,
+            nprobe=IVF_NPROBE,
+            ivf_min_rows=IVF_MIN_ROWS,
+            ivf_max_drift=IVF_MAX_DRIFT
         )
-    else:
+    return Chroma(
+        persist_directory=persist_directory,
+        embedding_function=embeddings
+    )
+
+def create_vectorstore(sync: bool = None, embeddings=None):
+    """
+    Create or load the vector store selected by VECTOR_BACKEND.
+
+    A missing index is built from scratch. With sync enabled (or INDEX_SYNC
+    set) an existing index is incrementally updated to match the corpus.
+    """
+    if embeddings is None:
+        embeddings = initialize_embeddings()
+    if sync is None:
+        sync = os.getenv("INDEX_SYNC", "false").lower() in ("1", "true", "yes")
+
+    exists = os.path.exists(PERSIST_DIRECTORY)
+    vectorstore = open_vectorstore(embeddings)
+
+    if exists and not sync:
         # Load existing vector store
-        return Chroma(
-            persist_directory="./chroma_db",
-            embedding_function=embeddings
-        ) 
\ No newline at end of file
+        return vectorstore
+
+    if exists and not os.path.exists(MANIFEST_PATH):
+        # Index predates manifests, its chunk ids are unknown so rebuild it
+        vectorstore.delete_collection()
+        vectorstore = open_vectorstore(embeddings)
+
+    report = sync_vectorstore(vectorstore)
+    print(f"Index sync: {report}")
+    return vectorstore
+
+if __name__ == "__main__":
+    create_vectorstore(sync=True)
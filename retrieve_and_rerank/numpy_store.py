@@ -0,0 +1,406 @@
+import os
+import json
+import math
+import hashlib
+import uuid
+import threading
+from typing import Any, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain.docstore.document import Document
+from langchain.vectorstores.base import VectorStore
+
+from ann_index import IVFIndex
+
+VECTORS_FILE = "vectors.f32.npy"
+QUANTIZED_FILE = "vectors.q.npy"
+SCALES_FILE = "scales.npy"
+DOCS_FILE = "docs.json"
+IVF_FILES = ("ivf.json", "ivf_centroids.npy", "ivf_rows.npy", "ivf_offsets.npy")
+
+# Rows converted to float32 at a time when scanning a quantized matrix
+SCAN_BLOCK_ROWS = 65536
+# Scores (rows x queries) computed at a time by a batched scan
+BATCH_SCAN_CELLS = 1 << 22
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.clip(norms, 1e-12, None)
+
+def _write_npy(path: str, array: np.ndarray):
+    """Write an array next to its final path and atomically swap it in"""
+    tmp_path = f"{path}.tmp.npy"
+    np.save(tmp_path, array)
+    os.replace(tmp_path, path)
+
+class _Snapshot:
+    """Immutable view of the index, swapped as a whole on every write"""
+    __slots__ = ("ids", "docs", "vectors", "quantized", "scales", "ivf")
+
+    def __init__(self, ids, docs, vectors, quantized=None, scales=None, ivf=None):
+        self.ids = ids
+        self.docs = docs
+        self.vectors = vectors
+        self.quantized = quantized
+        self.scales = scales
+        self.ivf = ivf
+
+class NumpyVectorStore(VectorStore):
+    """
+    In-process vector store over a memory-mapped float32 matrix.
+
+    Embeddings live in .npy files opened with mmap_mode="r", so loading is
+    instant and every worker process shares the same page cache instead of
+    holding its own copy. Search is a vectorized dot product followed by
+    argpartition top-k. With dtype "float16" or "int8" the scan runs over a
+    smaller quantized copy and the best candidates are rescored against the
+    float32 rows. With index "ivf" (and at least ivf_min_rows rows) only the
+    rows of the nprobe closest IVF cells are scanned.
+    """
+
+    def __init__(
+        self,
+        persist_directory: str,
+        embedding_function,
+        dtype: str = "float32",
+        oversample: int = 4,
+        index: str = "exact",
+        nlist: Optional[int] = None,
+        nprobe: int = 8,
+        ivf_min_rows: int = 10000,
+        ivf_max_drift: float = 0.2
+    ):
+        if dtype not in ("float32", "float16", "int8"):
+            raise ValueError(f"Unsupported dtype: {dtype}")
+        if index not in ("exact", "ivf"):
+            raise ValueError(f"Unsupported index: {index}")
+        self.persist_directory = persist_directory
+        self._embedding_function = embedding_function
+        self.dtype = dtype
+        self.oversample = oversample
+        self.index = index
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.ivf_min_rows = ivf_min_rows
+        self.ivf_max_drift = ivf_max_drift
+        self._write_lock = threading.Lock()
+        os.makedirs(persist_directory, exist_ok=True)
+        self._snapshot = self._load()
+
+    @property
+    def embeddings(self):
+        return self._embedding_function
+
+    def __len__(self) -> int:
+        return len(self._snapshot.ids)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.persist_directory, name)
+
+    def _load(self, previous: Optional[_Snapshot] = None, changed: Iterable[str] = ()) -> _Snapshot:
+        """
+        Open the persisted matrices as memory maps. After a write, previous
+        is the snapshot it replaced and changed the ids it upserted.
+        """
+        if not os.path.exists(self._path(DOCS_FILE)):
+            return _Snapshot([], [], None)
+        with open(self._path(DOCS_FILE)) as f:
+            stored = json.load(f)
+        vectors = np.load(self._path(VECTORS_FILE), mmap_mode="r")
+        quantized = scales = None
+        if self.dtype != "float32":
+            if not os.path.exists(self._path(QUANTIZED_FILE)) or stored.get("dtype") != self.dtype:
+                self._write_quantized(np.asarray(vectors))
+                stored["dtype"] = self.dtype
+                self._write_docs(stored["ids"], stored["docs"])
+            quantized = np.load(self._path(QUANTIZED_FILE), mmap_mode="r")
+            if self.dtype == "int8":
+                scales = np.load(self._path(SCALES_FILE), mmap_mode="r")
+        ivf = self._load_ivf(stored["ids"], vectors, previous, changed)
+        return _Snapshot(stored["ids"], stored["docs"], vectors, quantized, scales, ivf)
+
+    def _load_ivf(
+        self,
+        ids: List[str],
+        vectors: np.ndarray,
+        previous: Optional[_Snapshot] = None,
+        changed: Iterable[str] = ()
+    ) -> Optional[IVFIndex]:
+        """
+        Load the IVF index for these rows. After a write the previous index
+        is updated in place of a rebuild; full k-means only runs when the
+        index is missing, stale or has drifted past ivf_max_drift.
+        """
+        if self.index != "ivf" or len(ids) < self.ivf_min_rows:
+            return None
+        fingerprint = hashlib.sha1("\n".join(ids).encode("utf-8")).hexdigest()
+        if previous is not None and previous.ivf is not None:
+            ivf = previous.ivf.update(previous.ids, ids, vectors, set(changed), self.ivf_max_drift)
+        else:
+            ivf = IVFIndex.load(self.persist_directory, nprobe=self.nprobe, fingerprint=fingerprint)
+            if ivf is not None:
+                return ivf if not self.nlist or ivf.nlist == self.nlist else self._build_ivf(vectors, fingerprint)
+        if ivf is None:
+            return self._build_ivf(vectors, fingerprint)
+        ivf.save(self.persist_directory, fingerprint)
+        return ivf
+
+    def _build_ivf(self, vectors: np.ndarray, fingerprint: str) -> IVFIndex:
+        ivf = IVFIndex(nlist=self.nlist, nprobe=self.nprobe).build(vectors)
+        ivf.save(self.persist_directory, fingerprint)
+        return ivf
+
+    def _write_quantized(self, vectors: np.ndarray):
+        if self.dtype == "float16":
+            _write_npy(self._path(QUANTIZED_FILE), vectors.astype(np.float16))
+        else:
+            # Symmetric per-row int8 quantization
+            scales = np.abs(vectors).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            quantized = np.round(vectors / scales[:, None]).astype(np.int8)
+            _write_npy(self._path(QUANTIZED_FILE), quantized)
+            _write_npy(self._path(SCALES_FILE), scales.astype(np.float32))
+
+    def _write_docs(self, ids: List[str], docs: List[dict]):
+        tmp_path = f"{self._path(DOCS_FILE)}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"dtype": self.dtype, "ids": ids, "docs": docs}, f)
+        os.replace(tmp_path, self._path(DOCS_FILE))
+
+    def _persist(self, ids: List[str], docs: List[dict], vectors: np.ndarray, changed: Iterable[str] = ()):
+        """Rewrite the index files and swap in a fresh snapshot"""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        _write_npy(self._path(VECTORS_FILE), vectors)
+        if self.dtype != "float32":
+            self._write_quantized(vectors)
+        # The docs file is written last and marks the index as complete
+        self._write_docs(ids, docs)
+        self._snapshot = self._load(previous=self._snapshot, changed=changed)
+
+    def upsert_embeddings(
+        self,
+        ids: List[str],
+        embeddings: List[List[float]],
+        documents: List[str],
+        metadatas: Optional[List[dict]] = None
+    ):
+        """Insert or replace rows with precomputed embeddings in one write"""
+        if not ids:
+            return
+        metadatas = metadatas or [{} for _ in ids]
+        new_vectors = _normalize(np.asarray(embeddings, dtype=np.float32))
+
+        with self._write_lock:
+            snapshot = self._snapshot
+            replaced = set(ids)
+            keep = [row for row, doc_id in enumerate(snapshot.ids) if doc_id not in replaced]
+            old_vectors = (
+                np.asarray(snapshot.vectors)[keep] if snapshot.vectors is not None
+                else np.empty((0, new_vectors.shape[1]), dtype=np.float32)
+            )
+            self._persist(
+                [snapshot.ids[row] for row in keep] + list(ids),
+                [snapshot.docs[row] for row in keep] + [
+                    {"text": text, "metadata": metadata or {}}
+                    for text, metadata in zip(documents, metadatas)
+                ],
+                np.vstack([old_vectors, new_vectors]),
+                changed=ids
+            )
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any
+    ) -> List[str]:
+        """Embed and add texts"""
+        texts = list(texts)
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        self.upsert_embeddings(ids, self._embedding_function.embed_documents(texts), texts, metadatas)
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        """Remove rows by id"""
+        if not ids:
+            return False
+        with self._write_lock:
+            snapshot = self._snapshot
+            drop = set(ids)
+            keep = [row for row, doc_id in enumerate(snapshot.ids) if doc_id not in drop]
+            if len(keep) == len(snapshot.ids):
+                return False
+            self._persist(
+                [snapshot.ids[row] for row in keep],
+                [snapshot.docs[row] for row in keep],
+                np.asarray(snapshot.vectors)[keep]
+            )
+        return True
+
+    def delete_collection(self):
+        """Remove every row"""
+        with self._write_lock:
+            for name in (VECTORS_FILE, QUANTIZED_FILE, SCALES_FILE, DOCS_FILE) + IVF_FILES:
+                if os.path.exists(self._path(name)):
+                    os.remove(self._path(name))
+            self._snapshot = _Snapshot([], [], None)
+
+    def get(self) -> dict:
+        """All stored ids, texts and metadata, mirroring Chroma's collection.get()"""
+        snapshot = self._snapshot
+        return {
+            "ids": list(snapshot.ids),
+            "documents": [doc["text"] for doc in snapshot.docs],
+            "metadatas": [doc["metadata"] for doc in snapshot.docs],
+        }
+
+    def _scores(self, snapshot: _Snapshot, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Row indices and cosine scores of the top-k rows, best first"""
+        if snapshot.ivf is not None:
+            # Only the rows in the closest IVF cells are candidates
+            rows = snapshot.ivf.probe(query)
+            if len(rows) == 0:
+                return rows, np.array([], dtype=np.float32)
+            rows.sort()
+        else:
+            rows = None
+
+        if snapshot.quantized is None:
+            if rows is None:
+                scores = snapshot.vectors @ query
+                rows = np.arange(len(snapshot.ids))
+            else:
+                scores = np.asarray(snapshot.vectors[rows]) @ query
+        else:
+            if rows is None:
+                # Scan the quantized copy block by block
+                n = len(snapshot.ids)
+                rows = np.arange(n)
+                approx = np.empty(n, dtype=np.float32)
+                for start in range(0, n, SCAN_BLOCK_ROWS):
+                    block = np.asarray(snapshot.quantized[start:start + SCAN_BLOCK_ROWS], dtype=np.float32)
+                    approx[start:start + len(block)] = block @ query
+            else:
+                approx = np.asarray(snapshot.quantized[rows], dtype=np.float32) @ query
+            if snapshot.scales is not None:
+                approx *= snapshot.scales[rows]
+
+            # Rescore the best quantized candidates in float32
+            n_candidates = min(len(rows), k * self.oversample)
+            candidates = np.argpartition(-approx, n_candidates - 1)[:n_candidates]
+            rows = np.sort(rows[candidates])
+            scores = np.asarray(snapshot.vectors[rows]) @ query
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return rows[top], scores[top]
+
+    def _scores_batch(self, snapshot: _Snapshot, queries: np.ndarray, k: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Top-k rows and scores for several queries. Without IVF the matrix is
+        scanned once for all of them, one block-by-queries product at a time,
+        keeping only each query's best candidates between blocks so memory
+        stays O(BATCH_SCAN_CELLS + queries x k).
+        """
+        if snapshot.ivf is not None:
+            return [self._scores(snapshot, query, k) for query in queries]
+
+        n = len(snapshot.ids)
+        matrix = snapshot.vectors if snapshot.quantized is None else snapshot.quantized
+        # Quantized scores only pick candidates, which are rescored in float32
+        n_keep = min(n, k if snapshot.quantized is None else k * self.oversample)
+        # Fewer rows per block the more queries share the scan
+        block_rows = max(n_keep, min(SCAN_BLOCK_ROWS, BATCH_SCAN_CELLS // len(queries)))
+        best_rows = np.empty((0, len(queries)), dtype=np.int64)
+        best_scores = np.empty((0, len(queries)), dtype=np.float32)
+        for start in range(0, n, block_rows):
+            block = np.asarray(matrix[start:start + block_rows], dtype=np.float32)
+            # Negated scores, so argpartition's smallest are the best rows
+            block_scores = block @ -queries.T
+            if snapshot.scales is not None:
+                block_scores *= snapshot.scales[start:start + len(block), None]
+
+            # This block's best rows per query, merged into the running candidates
+            if len(block) > n_keep:
+                top = np.argpartition(block_scores, n_keep - 1, axis=0)[:n_keep]
+                block_scores = np.take_along_axis(block_scores, top, axis=0)
+            else:
+                top = np.broadcast_to(np.arange(len(block))[:, None], block_scores.shape)
+            rows = np.vstack([best_rows, top + start])
+            scores = np.vstack([best_scores, block_scores])
+            if len(scores) > n_keep:
+                keep = np.argpartition(scores, n_keep - 1, axis=0)[:n_keep]
+                rows = np.take_along_axis(rows, keep, axis=0)
+                scores = np.take_along_axis(scores, keep, axis=0)
+            best_rows, best_scores = rows, scores
+
+        results = []
+        for j, query in enumerate(queries):
+            rows, row_scores = best_rows[:, j], -best_scores[:, j]
+            if snapshot.quantized is not None:
+                rows = np.sort(rows)
+                row_scores = np.asarray(snapshot.vectors[rows]) @ query
+            top_k = min(k, len(row_scores))
+            top = np.argpartition(-row_scores, top_k - 1)[:top_k]
+            top = top[np.argsort(-row_scores[top])]
+            results.append((rows[top], row_scores[top]))
+        return results
+
+    def similarity_search_by_vectors(self, embeddings: List[List[float]], k: int = 4) -> List[List[Document]]:
+        """Top-k documents for each of several embeddings, searched together"""
+        snapshot = self._snapshot
+        if not snapshot.ids or k <= 0 or len(embeddings) == 0:
+            return [[] for _ in embeddings]
+        queries = _normalize(np.asarray(embeddings, dtype=np.float32))
+        return [
+            [
+                Document(page_content=snapshot.docs[row]["text"], metadata=snapshot.docs[row]["metadata"])
+                for row in rows
+            ]
+            for rows, _ in self._scores_batch(snapshot, queries, k)
+        ]
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4) -> List[Tuple[Document, float]]:
+        """Top-k documents and cosine similarities for an embedding"""
+        snapshot = self._snapshot
+        if not snapshot.ids or k <= 0:
+            return []
+        query = _normalize(np.asarray(embedding, dtype=np.float32))
+        rows, scores = self._scores(snapshot, query, k)
+        return [
+            (
+                Document(page_content=snapshot.docs[row]["text"], metadata=snapshot.docs[row]["metadata"]),
+                float(score)
+            )
+            for row, score in zip(rows, scores)
+        ]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self._embedding_function.embed_query(query), k)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    def _select_relevance_score_fn(self):
+        # Same scale as Chroma's default L2 space on normalized vectors,
+        # where the squared distance is 2 - 2 * cosine
+        return lambda cosine: 1.0 - (2.0 - 2.0 * cosine) / math.sqrt(2)
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding,
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        persist_directory: str = "./numpy_index",
+        **kwargs: Any
+    ) -> "NumpyVectorStore":
+        store = cls(persist_directory, embedding, **kwargs)
+        store.add_texts(texts, metadatas, ids)
+        return store
@@ -1,32 +1,151 @@
-from typing import List, Dict
+import os
+from typing import List, Dict, Optional
 from sentence_transformers import CrossEncoder
 import numpy as np
 
+from batcher import BatchScheduler
+from metrics import record_cache
+from score_cache import ScoreCache
+
 class Reranker:
-    def __init__(self, model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"):
-        """Initialize the reranker with a cross-encoder model"""
-        self.model = CrossEncoder(model_name)
-    
+    def __init__(
+        self,
+        model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2",
+        batching: Optional[bool] = None,
+        max_batch_size: Optional[int] = None,
+        max_wait_ms: Optional[float] = None,
+        cache_size: Optional[int] = None,
+        cache_ttl_seconds: Optional[float] = None,
+        backend: Optional[str] = None
+    ):
+        """
+        Initialize the reranker with a cross-encoder model.
+
+        When batching is enabled, pairs from concurrent requests are coalesced
+        into shared predict calls. Scores are cached per (query, chunk, model)
+        so only unseen pairs reach the model; a cache_size of 0 disables it.
+        The onnx backend swaps in the int8-quantized ONNX Runtime export of
+        the same model. Unset arguments fall back to the RERANK_BATCHING,
+        RERANK_MAX_BATCH_SIZE, RERANK_MAX_WAIT_MS, RERANK_CACHE_SIZE,
+        RERANK_CACHE_TTL and INFERENCE_BACKEND environment variables.
+        """
+        if backend is None:
+            backend = os.getenv("INFERENCE_BACKEND", "torch").lower()
+
+        self.model_name = model_name
+        self.backend = backend
+        if backend == "onnx":
+            from onnx_backend import ONNXCrossEncoder
+            self.model = ONNXCrossEncoder(model_name)
+        else:
+            self.model = CrossEncoder(model_name)
+
+        if batching is None:
+            batching = os.getenv("RERANK_BATCHING", "false").lower() in ("1", "true", "yes")
+        if max_batch_size is None:
+            max_batch_size = int(os.getenv("RERANK_MAX_BATCH_SIZE", "64"))
+        if max_wait_ms is None:
+            max_wait_ms = float(os.getenv("RERANK_MAX_WAIT_MS", "5"))
+        if cache_size is None:
+            cache_size = int(os.getenv("RERANK_CACHE_SIZE", "10000"))
+        if cache_ttl_seconds is None:
+            cache_ttl_seconds = float(os.getenv("RERANK_CACHE_TTL", "3600"))
+
+        self.scheduler = None
+        if batching:
+            self.scheduler = BatchScheduler(
+                self.model.predict,
+                max_batch_size=max_batch_size,
+                max_wait_ms=max_wait_ms
+            )
+
+        self.cache = ScoreCache(cache_size, cache_ttl_seconds) if cache_size > 0 else None
+
+    def _predict(self, pairs: List[List[str]]) -> np.ndarray:
+        """Run the cross-encoder, through the batch scheduler if enabled"""
+        if self.scheduler is not None:
+            return self.scheduler.score(pairs)
+        return self.model.predict(pairs)
+
+    def score_pairs(self, pairs: List[List[str]]) -> np.ndarray:
+        """
+        Score (query, document) pairs, only sending uncached pairs to the model.
+        """
+        if self.cache is None:
+            return self._predict(pairs)
+
+        # Backends score slightly differently, so they never share entries
+        model_key = f"{self.model_name}@{self.backend}"
+        keys = [ScoreCache.make_key(query, doc, model_key) for query, doc in pairs]
+        cached = self.cache.get_many(keys)
+
+        scores = np.empty(len(pairs), dtype=np.float32)
+        missing = []
+        for i, key in enumerate(keys):
+            if key in cached:
+                scores[i] = cached[key]
+            else:
+                missing.append(i)
+        record_cache("rerank_score", hits=len(pairs) - len(missing), misses=len(missing))
+
+        if missing:
+            fresh = self._predict([pairs[i] for i in missing])
+            for i, score in zip(missing, fresh):
+                scores[i] = score
+            self.cache.set_many({keys[i]: float(scores[i]) for i in missing})
+
+        return scores
+
     def rerank_documents(self, query: str, documents: List[str], top_k: int = 5) -> List[str]:
         """
         Rerank documents based on their relevance to the query.
-        
+
         Args:
             query: The search query
             documents: List of document texts to rerank
             top_k: Number of documents to return after reranking
-            
+
         Returns:
             List of reranked document texts
         """
+        if not documents:
+            return []
+
         # Create pairs of query and documents for scoring
         pairs = [[query, doc] for doc in documents]
-        
+
         # Get scores for all pairs
-        scores = self.model.predict(pairs)
-        
+        scores = self.score_pairs(pairs)
+
         # Get indices of top-k documents
         top_indices = np.argsort(scores)[-top_k:][::-1]
-        
+
         # Return reranked documents
-        return [documents[i] for i in top_indices] 
\ No newline at end of file
+        return [documents[i] for i in top_indices]
+
+    def rerank_batch(self, queries: List[str], documents: List[List[str]], top_k: int = 5) -> List[List[str]]:
+        """
+        Rerank the candidates of several queries with a single model call.
+
+        Args:
+            queries: The search queries
+            documents: Candidate document texts for each query
+            top_k: Number of documents to return per query
+
+        Returns:
+            Reranked document texts for each query
+        """
+        pairs = [[query, doc] for query, docs in zip(queries, documents) for doc in docs]
+        if not pairs:
+            return [[] for _ in queries]
+
+        # Score every (query, document) pair of the batch together
+        scores = self.score_pairs(pairs)
+
+        results, offset = [], 0
+        for docs in documents:
+            query_scores = scores[offset:offset + len(docs)]
+            offset += len(docs)
+            top_indices = np.argsort(query_scores)[-top_k:][::-1]
+            results.append([docs[i] for i in top_indices])
+        return results
\ No newline at end of file
@@ -0,0 +1,82 @@
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterable, Tuple
+
+def normalize_query(query: str) -> str:
+    """Lowercase and collapse whitespace so trivially different queries share entries"""
+    return re.sub(r"\s+", " ", query).strip().lower()
+
+def content_hash(text: str) -> str:
+    """Stable hash of a chunk's content"""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+class ScoreCache:
+    """
+    Bounded LRU cache of cross-encoder scores with an optional TTL.
+
+    Keys are (normalized query, chunk content hash, model name) so a cached
+    score is only reused for the exact same chunk scored by the same model.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 3600.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(query: str, document: str, model_name: str) -> Tuple[str, str, str]:
+        """Build the cache key for a (query, document) pair"""
+        return (normalize_query(query), content_hash(document), model_name)
+
+    def get_many(self, keys: Iterable[Hashable]) -> Dict[Hashable, float]:
+        """Return cached scores for the keys that are present and not expired"""
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None and (not self.ttl_seconds or now - entry[1] < self.ttl_seconds):
+                    self._entries.move_to_end(key)
+                    found[key] = entry[0]
+                    self.hits += 1
+                else:
+                    if entry is not None:
+                        del self._entries[key]
+                    self.misses += 1
+        return found
+
+    def set_many(self, scores: Dict[Hashable, float]):
+        """Store scores, evicting the least recently used entries beyond max_entries"""
+        now = time.monotonic()
+        with self._lock:
+            for key, score in scores.items():
+                self._entries[key] = (score, now)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every cached score"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """Hit-rate counters used to size the cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -1,22 +1,136 @@
-from typing import List
+from typing import List, AsyncIterator, Optional, Tuple
 import os
-from openai import OpenAI
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from rerank import Reranker
+from bm25 import BM25Index, reciprocal_rank_fusion
+from context_builder import build_context
+from db import chroma_collection
+from llm_client import AsyncLLMClient, get_async_llm_client
+from metrics import observe_stage, record_llm_usage, track_stage
+from numpy_store import NumpyVectorStore
 
 # Load environment variables
 load_dotenv()
 
-# Initialize OpenAI client
-OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
-if not OPENAI_API_KEY:
-    raise ValueError("OPENAI_API_KEY not found in .env file")
-client = OpenAI(api_key=OPENAI_API_KEY)
+def get_client() -> AsyncLLMClient:
+    """Shared LLM client with pooling, retries and rate limiting"""
+    return get_async_llm_client()
 
-# Initialize reranker
-reranker = Reranker()
+LLM_MODEL = "gpt-4"
 
-def search_documents(vectorstore, query: str, k: int = 10) -> List[str]:
+# Bounded pool for CPU-bound retrieval work so it never blocks the event loop
+SEARCH_MAX_WORKERS = int(os.getenv("SEARCH_MAX_WORKERS", "4"))
+search_executor = ThreadPoolExecutor(
+    max_workers=SEARCH_MAX_WORKERS,
+    thread_name_prefix="search"
+)
+
+# Cross-encoder reranker, loaded by get_reranker during startup or on first use
+reranker: Optional[Reranker] = None
+_reranker_lock = threading.Lock()
+
+def get_reranker() -> Reranker:
+    """Load the reranker on first use"""
+    global reranker
+    with _reranker_lock:
+        if reranker is None:
+            reranker = Reranker()
+    return reranker
+
+# BM25 index over the vector store's chunks, built by get_lexical_index
+lexical_index: Optional[BM25Index] = None
+_lexical_index_lock = threading.Lock()
+
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+def get_lexical_index(vectorstore) -> BM25Index:
+    """Build the BM25 index from the vector store on first use"""
+    global lexical_index
+    with _lexical_index_lock:
+        if lexical_index is None:
+            lexical_index = BM25Index.from_vectorstore(vectorstore)
+    return lexical_index
+
+def dense_search(vectorstore, query: str, k: int) -> List[str]:
+    """
+    Embed the query and search the vector store, timing both stages.
+    """
+    with track_stage("embed"):
+        vector = vectorstore.embeddings.embed_query(query)
+    with track_stage("vector_search"):
+        results = vectorstore.similarity_search_by_vector(vector, k=k)
+    return [doc.page_content for doc in results]
+
+def hybrid_candidates(vectorstore, query: str, k: int = 10) -> List[str]:
+    """
+    Fuse the top k dense and top k BM25 results with reciprocal rank
+    fusion and keep the best k as reranking candidates.
+    """
+    dense = dense_search(vectorstore, query, k)
+    with track_stage("bm25_search"):
+        lexical = [text for text, _ in get_lexical_index(vectorstore).search(query, k)]
+    return reciprocal_rank_fusion([dense, lexical], k=RRF_K)[:k]
+
+# Cascade thresholds on the dense relevance scores (0-1 range)
+CASCADE_WIN_GAP = float(os.getenv("CASCADE_WIN_GAP", "0.15"))
+CASCADE_DROP_MARGIN = float(os.getenv("CASCADE_DROP_MARGIN", "0.25"))
+CASCADE_DEPTH_GAP = float(os.getenv("CASCADE_DEPTH_GAP", "0.1"))
+
+def cascade_split(
+    scored: List[Tuple[str, float]],
+    top_k: int,
+    win_gap: float = CASCADE_WIN_GAP,
+    drop_margin: float = CASCADE_DROP_MARGIN,
+    depth_gap: float = CASCADE_DEPTH_GAP
+) -> Tuple[List[str], List[str]]:
+    """
+    Split dense search results into clear winners and an ambiguous band.
+
+    Args:
+        scored: (text, relevance score) pairs sorted by descending score
+        top_k: Number of documents the caller needs
+        win_gap: Score gap that separates a leading run of clear winners
+        drop_margin: Past top_k, documents this far below the best one are dropped
+        depth_gap: Past top_k, a gap this large ends the candidate list
+
+    Returns:
+        Tuple of (winners kept in dense order, band that still needs reranking)
+    """
+    if not scored:
+        return [], []
+
+    best = scored[0][1]
+
+    # Adaptive depth: past top_k, stop at the first clear loser or large gap
+    candidates = scored[:top_k]
+    for i in range(top_k, len(scored)):
+        score = scored[i][1]
+        if best - score > drop_margin or candidates[-1][1] - score > depth_gap:
+            break
+        candidates.append(scored[i])
+
+    # Clear winners: the longest prefix (up to top_k) followed by a big score gap
+    n_winners = 0
+    for i in range(1, min(top_k, len(candidates) - 1) + 1):
+        if candidates[i - 1][1] - candidates[i][1] >= win_gap:
+            n_winners = i
+
+    winners = [text for text, _ in candidates[:n_winners]]
+    band = [text for text, _ in candidates[n_winners:]]
+    return winners, band
+
+def search_documents(
+    vectorstore,
+    query: str,
+    k: int = 10,
+    top_k: int = 3,
+    cascade: bool = False,
+    hybrid: bool = False
+) -> List[str]:
     """
     Perform similarity search and rerank the results.
     
@@ -24,50 +138,220 @@ def search_documents(vectorstore, query: str, k: int = 10) -> List[str]:
         vectorstore: The vector store to search in
         query: The search query
         k: Number of documents to retrieve initially (before reranking)
+        top_k: Number of documents to return after reranking
+        cascade: Only rerank the ambiguous band of the dense results
+        hybrid: Fuse BM25 and dense results into the candidate list
+            (ignored with cascade, which needs the dense scores)
         
     Returns:
         List of reranked document texts
     """
     try:
+        if cascade:
+            return search_documents_cascade(vectorstore, query, k, top_k)
+
         # Retrieve more documents than needed for reranking
-        results = vectorstore.similarity_search(
-            query,
-            k=k
-        )
-        documents = [doc.page_content for doc in results]
+        if hybrid:
+            documents = hybrid_candidates(vectorstore, query, k)
+        else:
+            documents = dense_search(vectorstore, query, k)
         
         # Rerank the documents
-        reranked_docs = reranker.rerank_documents(query, documents, top_k=3)
+        with track_stage("rerank"):
+            reranked_docs = get_reranker().rerank_documents(query, documents, top_k=top_k)
         
         return reranked_docs
     except Exception as e:
         print(f"Error performing search and reranking: {str(e)}")
         return []
 
-def get_answer(query: str, context: List[str]) -> str:
+def search_documents_cascade(vectorstore, query: str, k: int = 10, top_k: int = 3) -> List[str]:
+    """
+    Cascaded retrieve and rerank.
+
+    Uses the dense relevance scores to accept clear winners and drop clear
+    losers without the cross-encoder, and only reranks the ambiguous band
+    for the remaining slots.
+    """
+    # Relevance scores need the store's own query path, so embedding is included
+    with track_stage("vector_search"):
+        results = vectorstore.similarity_search_with_relevance_scores(
+            query,
+            k=k
+        )
+    scored = [(doc.page_content, score) for doc, score in results]
+    winners, band = cascade_split(scored, top_k)
+
+    remaining = top_k - len(winners)
+    if remaining <= 0:
+        return winners[:top_k]
+    if len(band) <= remaining:
+        return winners + band
+
+    with track_stage("rerank"):
+        return winners + get_reranker().rerank_documents(query, band, top_k=remaining)
+
+async def search_documents_async(
+    vectorstore,
+    query: str,
+    k: int = 10,
+    top_k: int = 3,
+    cascade: bool = False,
+    hybrid: bool = False
+) -> List[str]:
+    """
+    Run search_documents on the bounded search executor so retrieval
+    does not block the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        search_executor, search_documents, vectorstore, query, k, top_k, cascade, hybrid
+    )
+
+def similarity_search_batch(vectorstore, vectors: List[List[float]], k: int) -> List[List[str]]:
+    """
+    Top-k texts for several query vectors in one vector store call.
+    """
+    if isinstance(vectorstore, NumpyVectorStore):
+        results = vectorstore.similarity_search_by_vectors(vectors, k=k)
+        return [[doc.page_content for doc in docs] for docs in results]
+
+    collection, _ = chroma_collection(vectorstore)
+    results = collection.query(
+        query_embeddings=vectors,
+        n_results=k,
+        include=["documents"]
+    )
+    return results["documents"]
+
+def search_documents_batch(
+    vectorstore,
+    queries: List[str],
+    k: int = 10,
+    top_k: int = 3,
+    hybrid: bool = False
+) -> List[List[str]]:
+    """
+    Retrieve and rerank for several queries at once: one embedding forward
+    pass, one batched vector search and one cross-encoder call over all
+    (query, document) pairs.
+
+    Args:
+        vectorstore: The vector store to search in
+        queries: The search queries
+        k: Number of documents to retrieve per query before reranking
+        top_k: Number of documents to return per query after reranking
+        hybrid: Fuse BM25 and dense results into each candidate list
+
+    Returns:
+        Reranked document texts for each query
+
+    Errors propagate, so a failed search is not answered from empty contexts.
+    """
+    if not queries:
+        return []
+    with track_stage("embed"):
+        vectors = vectorstore.embeddings.embed_documents(queries)
+    with track_stage("vector_search"):
+        candidates = similarity_search_batch(vectorstore, vectors, k)
+
+    if hybrid:
+        with track_stage("bm25_search"):
+            index = get_lexical_index(vectorstore)
+            lexical = [[text for text, _ in index.search(query, k)] for query in queries]
+        candidates = [
+            reciprocal_rank_fusion([dense, lexical_texts], k=RRF_K)[:k]
+            for dense, lexical_texts in zip(candidates, lexical)
+        ]
+
+    with track_stage("rerank"):
+        return get_reranker().rerank_batch(queries, candidates, top_k=top_k)
+
+async def search_documents_batch_async(
+    vectorstore,
+    queries: List[str],
+    k: int = 10,
+    top_k: int = 3,
+    hybrid: bool = False
+) -> List[List[str]]:
+    """
+    Run search_documents_batch on the bounded search executor.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        search_executor, search_documents_batch, vectorstore, queries, k, top_k, hybrid
+    )
+
+def build_messages(query: str, context: List[str]) -> List[dict]:
+    """
+    Build the chat messages for the query and its retrieved context.
+    The context is de-duplicated and packed to the prompt token budget.
+    """
+    system_prompt = f'''You are an intelligent bot that answers questions based on the provided context.
+    Context:
+    {build_context(context)}
+    
+    Please provide a clear and concise answer based on the context above.
+    If the context doesn't contain enough information to answer the question, please say so.
+    '''
+    
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": query}
+    ]
+
+async def build_messages_async(query: str, context: List[str]) -> List[dict]:
+    """
+    Run build_messages on the bounded search executor; tokenizing, merging
+    and de-duplicating the context would otherwise block the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(search_executor, build_messages, query, context)
+
+async def get_answer(query: str, context: List[str]) -> str:
     """
     Generate answer using OpenAI API based on the query and reranked context.
     """
     try:
-        system_prompt = f'''You are an intelligent bot that answers questions based on the provided context.
-        Context: {context}
-        
-        Please provide a clear and concise answer based on the context above.
-        If the context doesn't contain enough information to answer the question, please say so.
-        '''
-        
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": query}
-        ]
-        
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=messages
-        )
+        messages = await build_messages_async(query, context)
+        with track_stage("llm"):
+            response = await get_client().chat_completion(
+                model=LLM_MODEL,
+                messages=messages
+            )
+        record_llm_usage(LLM_MODEL, response.usage)
         
         return response.choices[0].message.content
         
     except Exception as e:
         print(f"Error generating answer: {str(e)}")
-        return "Sorry, I encountered an error while generating the answer." 
\ No newline at end of file
+        return "Sorry, I encountered an error while generating the answer."
+
+async def stream_answer(query: str, context: List[str]) -> AsyncIterator[str]:
+    """
+    Stream the answer token by token as the OpenAI API produces it.
+    """
+    try:
+        messages = await build_messages_async(query, context)
+        start = time.perf_counter()
+        first_token = True
+        stream = await get_client().chat_completion(
+            model=LLM_MODEL,
+            messages=messages,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        
+        async for chunk in stream:
+            if chunk.usage:
+                record_llm_usage(LLM_MODEL, chunk.usage)
+            if chunk.choices and chunk.choices[0].delta.content:
+                if first_token:
+                    observe_stage("llm_first_token", time.perf_counter() - start)
+                    first_token = False
+                yield chunk.choices[0].delta.content
+        observe_stage("llm", time.perf_counter() - start)
+                
+    except Exception as e:
+        print(f"Error streaming answer: {str(e)}")
+        yield "Sorry, I encountered an error while generating the answer."
\ No newline at end of file